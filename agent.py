@@ -1,15 +1,18 @@
 import chainlit as cl
-from dotenv import load_dotenv
 from mistralai import (
     ToolReferenceChunk,
     FunctionResultEntry,
+    MessageInputEntry,
     MessageOutputEvent,
     AgentHandoffDoneEvent,
     FunctionCallEvent,
     ToolExecutionStartedEvent,
     ResponseErrorEvent,
 )
+import asyncio
+import hashlib
 import json
+import orjson
 from tools.daily_progress_tool import DAILY_PROGRESS_TOOL, daily_progress
 from tools.goal_setting_tool import GOAL_SETTING_TOOL, goal_setting
 from tools.food_logging_tool import FOOD_LOGGING_TOOL, food_logging
@@ -17,19 +20,68 @@ from tools.food_recommendations_tool import FOOD_RECOMMENDATIONS_TOOL, food_reco
 from tools.web_search_tool import WEB_SEARCH_TOOL, exa_web_search
 from tools.workout_planning_tool import WORKOUT_PLANNING_TOOL, workout_planning
 from tools.profile_management_tool import PROFILE_MANAGEMENT_TOOL, profile_management, auto_store_user_name, get_user_identity
-from tools.data_manager import data_manager
 from tools.memory_manager import memory_manager
-from collections import defaultdict
+from tools.response_cache import response_cache
+from tools.llm_cache import llm_cache
+from tools.tool_cache import tool_cache, is_error_result
+from tools.quick_replies import classify_trivial
+from tools.context_compressor import context_compressor
+from dataclasses import dataclass, field
 from loguru import logger
 from tools.configs import mistral_model, client
 from pydantic_core import ValidationError
 import os
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Optional
 
-load_dotenv()
+# Tools that modify user data; turns using them are never served from the response cache
+WRITE_TOOLS = {"food_log", "goal_setting", "profile_management"}
+
+# Upper bound on chained tool-call rounds within a single user turn
+MAX_TOOL_ROUNDS = 5
+
+# Result sent for tool calls still pending when MAX_TOOL_ROUNDS runs out
+TOOL_ROUNDS_EXCEEDED_RESULT = json.dumps({
+    "status": "error",
+    "message": f"Not executed: the {MAX_TOOL_ROUNDS}-round tool call limit for the turn was reached"
+})
+
+# Agent IDs from previous runs, keyed by a hash of each agent definition
+AGENT_CACHE_PATH = Path(".nutrisense_agents.json")
+
+def _hash_payload(payload) -> str:
+    """Stable hash of a JSON-serializable payload"""
+    return hashlib.sha256(orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)).hexdigest()
 
 class AgentManager:
     """Manages all agents and their configurations"""
     
+    # Handoff relationships between agents (source agent -> target agents)
+    HANDOFFS = {
+        # Router can handoff to any agent
+        'router': [
+            'food_logging', 'goal_setting', 'food_recommendations', 'daily_progress',
+            'web_search', 'workout_planning', 'profile_management'
+        ],
+        # Profile management can handoff to related agents
+        'profile_management': ['goal_setting', 'workout_planning', 'daily_progress'],
+        # Workout planning can handoff to related agents
+        'workout_planning': ['food_recommendations', 'daily_progress', 'profile_management'],
+        # Goal setting can handoff to related agents
+        'goal_setting': [
+            'food_logging', 'food_recommendations', 'daily_progress', 'web_search', 'workout_planning'
+        ],
+        # Food logging can handoff to analysis agents
+        'food_logging': ['food_recommendations', 'daily_progress', 'web_search'],
+        # Food recommendations can handoff to progress tracking
+        'food_recommendations': ['daily_progress', 'web_search', 'workout_planning'],
+        # Web search can handoff to core agents
+        'web_search': ['food_logging', 'goal_setting', 'daily_progress', 'workout_planning'],
+        # Daily progress can handoff to recommendations and logging
+        'daily_progress': ['food_recommendations', 'food_logging', 'workout_planning'],
+    }
+    
     def __init__(self):
         self.function_tool_mapping = {
             "goal_setting": goal_setting,
@@ -41,214 +93,200 @@ class AgentManager:
             "profile_management": profile_management,
         }
         
-        # Initialize all agents
-        self.agents = self._create_agents()
-        self._setup_handoffs()
+        # Initialize all agents concurrently (one network round-trip of wall time).
+        # Bootstrap uses the sync client in threads: the pooled async client must not
+        # hold connections from this short-lived event loop.
+        self.agents = {}
+        asyncio.run(self._abootstrap())
     
-    def _create_agents(self):
-        """Create all agents with improved descriptions"""
-        agents = {}
+    async def _abootstrap(self):
+        """Create (or reuse cached) agents and then wire up their handoffs"""
+        specs = self._agent_specs()
+        spec_keys = {name: _hash_payload(spec) for name, spec in specs.items()}
+        cache = self._load_agent_cache()
+        cached_agents = cache.get("agents", {})
         
-        # Router agent
-        agents['router'] = client.beta.agents.create(
-            model=mistral_model,
-            description="Intelligent routing agent that directs user queries to the most appropriate specialized agent for comprehensive health and fitness assistance.",
-            instructions="Analyze user queries and route them to the correct agent. Consider the user's intent and select the most suitable agent for personalized health, nutrition, and fitness guidance.",
-            name="router-agent",
-        )
+        # Reuse agents whose definition has not changed since they were created
+        for name, key in spec_keys.items():
+            entry = cached_agents.get(name)
+            if entry and entry.get("key") == key:
+                self.agents[name] = SimpleNamespace(id=entry["id"])
+        
+        missing = [name for name in specs if name not in self.agents]
+        if missing:
+            self.agents.update(await self._acreate_agents({name: specs[name] for name in missing}))
+            logger.info(f"Created agents: {', '.join(missing)}")
+        else:
+            logger.info("Reusing cached agents")
+        
+        # Only re-apply handoffs when the resolved handoff graph changes
+        handoffs_key = _hash_payload({
+            source: [self.agents[target].id for target in targets]
+            for source, targets in self.HANDOFFS.items()
+        })
+        handoffs_changed = cache.get("handoffs_key") != handoffs_key
+        if handoffs_changed:
+            await self._asetup_handoffs()
         
-        # Food logging agent
-        agents['food_logging'] = client.beta.agents.create(
-            model=mistral_model,
-            name="food-logging-agent",
-            description="""Agent specialized in logging food consumption with nutritional analysis.
+        if missing or handoffs_changed:
+            self._save_agent_cache({
+                "agents": {
+                    name: {"key": spec_keys[name], "id": self.agents[name].id}
+                    for name in specs
+                },
+                "handoffs_key": handoffs_key,
+            })
+    
+    def _load_agent_cache(self) -> dict:
+        """Load previously created agent IDs from disk"""
+        try:
+            with open(AGENT_CACHE_PATH, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable agent cache: {e}")
+            return {}
+    
+    def _save_agent_cache(self, cache: dict):
+        """Persist created agent IDs to disk"""
+        try:
+            with open(AGENT_CACHE_PATH, "w", encoding="utf-8") as f:
+                json.dump(cache, f, indent=2)
+        except Exception as e:
+            logger.warning(f"Could not save agent cache: {e}")
+    
+    def _agent_specs(self):
+        """Return the creation parameters for every agent, keyed by agent name"""
+        return {
+            # Router agent
+            'router': dict(
+                model=mistral_model,
+                description="Intelligent routing agent that directs user queries to the most appropriate specialized agent for comprehensive health and fitness assistance.",
+                instructions="Analyze user queries and route them to the correct agent. Consider the user's intent and select the most suitable agent for personalized health, nutrition, and fitness guidance.",
+                name="router-agent",
+            ),
+            
+            # Food logging agent
+            'food_logging': dict(
+                model=mistral_model,
+                name="food-logging-agent",
+                description="""Agent specialized in logging food consumption with nutritional analysis.
                            Handles queries like:
                            - "I had 2 eggs for breakfast"
                            - "Log my lunch: chicken salad with vegetables"
                            - "I ate a bowl of oatmeal this morning"
                            """,
-            instructions="Use the food logging tool to record meals and provide nutritional information. Keep responses concise and encouraging.",
-            tools=[FOOD_LOGGING_TOOL],
-        )
-        
-        # Goal setting agent
-        agents['goal_setting'] = client.beta.agents.create(
-            model=mistral_model,
-            name="goal-setting-agent",
-            description="""Agent specialized in setting and updating dietary goals and targets.
+                instructions="Use the food logging tool to record meals and provide nutritional information. Keep responses concise and encouraging.",
+                tools=[FOOD_LOGGING_TOOL],
+            ),
+            
+            # Goal setting agent
+            'goal_setting': dict(
+                model=mistral_model,
+                name="goal-setting-agent",
+                description="""Agent specialized in setting and updating dietary goals and targets.
                            Handles queries like:
                            - "Set my calorie goal to 2000 calories"
                            - "I want to lose weight, set my protein goal to 150g"
                            - "Update my daily carb target to 200g"
                            - "My goal is to gain muscle, set my targets"
                            """,
-            instructions="Use the goal setting tool to establish or update user dietary goals. Provide clear confirmation of goals set.",
-            tools=[GOAL_SETTING_TOOL],
-        )
-        
-        # Food recommendations agent
-        agents['food_recommendations'] = client.beta.agents.create(
-            model=mistral_model,
-            name="food-recommendations-agent",
-            description="""Agent that provides personalized food and meal recommendations.
+                instructions="Use the goal setting tool to establish or update user dietary goals. Provide clear confirmation of goals set.",
+                tools=[GOAL_SETTING_TOOL],
+            ),
+            
+            # Food recommendations agent
+            'food_recommendations': dict(
+                model=mistral_model,
+                name="food-recommendations-agent",
+                description="""Agent that provides personalized food and meal recommendations.
                            Handles queries like:
                            - "What should I eat for dinner?"
                            - "Suggest healthy snacks"
                            - "I need meal ideas for weight loss"
                            """,
-            instructions="Use the food recommendations tool to provide personalized meal suggestions based on user goals and food history.",
-            tools=[FOOD_RECOMMENDATIONS_TOOL],
-        )
-        
-        # Daily progress agent
-        agents['daily_progress'] = client.beta.agents.create(
-            model=mistral_model,
-            name="daily-progress-agent",
-            description="""Agent that analyzes and reports on daily nutritional progress.
+                instructions="Use the food recommendations tool to provide personalized meal suggestions based on user goals and food history.",
+                tools=[FOOD_RECOMMENDATIONS_TOOL],
+            ),
+            
+            # Daily progress agent
+            'daily_progress': dict(
+                model=mistral_model,
+                name="daily-progress-agent",
+                description="""Agent that analyzes and reports on daily nutritional progress.
                            Handles queries like:
                            - "How am I doing today?"
                            - "Show my daily progress"
                            - "Am I meeting my goals?"
                            """,
-            instructions="Use the daily progress tool to analyze user progress against goals. Provide encouraging and actionable feedback.",
-            tools=[DAILY_PROGRESS_TOOL],
-        )
-        
-        # Web search agent
-        agents['web_search'] = client.beta.agents.create(
-            model=mistral_model,
-            description="""Agent that searches the web for real-time nutrition and health information using Exa's neural search.
+                instructions="Use the daily progress tool to analyze user progress against goals. Provide encouraging and actionable feedback.",
+                tools=[DAILY_PROGRESS_TOOL],
+            ),
+            
+            # Web search agent
+            'web_search': dict(
+                model=mistral_model,
+                description="""Agent that searches the web for real-time nutrition and health information using Exa's neural search.
                            Handles queries like:
                            - "Find healthy restaurants near me"
                            - "Latest nutrition research on protein"
                            - "Best exercises for weight loss"
                            """,
-            name="web-search-agent",
-            instructions="Use the web search tool to find current, relevant information. Summarize findings clearly.",
-            tools=[WEB_SEARCH_TOOL],
-        )
-        
-        # Workout planning agent
-        agents['workout_planning'] = client.beta.agents.create(
-            model=mistral_model,
-            name="workout-planning-agent",
-            description="""Agent specialized in creating personalized workout plans based on BMI, weight, diet goals, and fitness preferences.
+                name="web-search-agent",
+                instructions="Use the web search tool to find current, relevant information. Summarize findings clearly.",
+                tools=[WEB_SEARCH_TOOL],
+            ),
+            
+            # Workout planning agent
+            'workout_planning': dict(
+                model=mistral_model,
+                name="workout-planning-agent",
+                description="""Agent specialized in creating personalized workout plans based on BMI, weight, diet goals, and fitness preferences.
                            Handles queries like:
                            - "Create a workout plan for weight loss"
                            - "I need a strength training routine"
                            - "Design a workout plan for my current fitness level"
                            - "I want to build muscle, what exercises should I do?"
                            """,
-            instructions="Use the workout planning tool to create comprehensive, personalized workout plans. Consider user's physical stats, goals, and preferences.",
-            tools=[WORKOUT_PLANNING_TOOL],
-        )
-        
-        # Profile management agent
-        agents['profile_management'] = client.beta.agents.create(
-            model=mistral_model,
-            name="profile-management-agent",
-            description="""Agent that manages user profiles including physical stats, preferences, and personal information.
+                instructions="Use the workout planning tool to create comprehensive, personalized workout plans. Consider user's physical stats, goals, and preferences.",
+                tools=[WORKOUT_PLANNING_TOOL],
+            ),
+            
+            # Profile management agent
+            'profile_management': dict(
+                model=mistral_model,
+                name="profile-management-agent",
+                description="""Agent that manages user profiles including physical stats, preferences, and personal information.
                            Handles queries like:
                            - "Update my profile"
                            - "Set my height and weight"
                            - "View my profile"
                            - "I'm 25 years old, 70kg, and 175cm tall"
                            """,
-            instructions="Use the profile management tool to help users manage their personal information for better personalization.",
-            tools=[PROFILE_MANAGEMENT_TOOL],
+                instructions="Use the profile management tool to help users manage their personal information for better personalization.",
+                tools=[PROFILE_MANAGEMENT_TOOL],
+            ),
+        }
+    
+    async def _acreate_agents(self, specs: dict):
+        """Create the given agents in parallel"""
+        created = await asyncio.gather(
+            *(asyncio.to_thread(client.beta.agents.create, **spec) for spec in specs.values())
         )
-        
-        return agents
+        return dict(zip(specs.keys(), created))
     
-    def _setup_handoffs(self):
-        """Setup handoff relationships between agents"""
+    async def _asetup_handoffs(self):
+        """Setup handoff relationships between agents in parallel"""
         try:
-            # Router can handoff to any agent
-            client.beta.agents.update(
-                agent_id=self.agents['router'].id,
-                handoffs=[
-                    self.agents['food_logging'].id,
-                    self.agents['goal_setting'].id,
-                    self.agents['food_recommendations'].id,
-                    self.agents['daily_progress'].id,
-                    self.agents['web_search'].id,
-                    self.agents['workout_planning'].id,
-                    self.agents['profile_management'].id
-                ]
-            )
-            
-            # Profile management can handoff to related agents
-            client.beta.agents.update(
-                agent_id=self.agents['profile_management'].id,
-                handoffs=[
-                    self.agents['goal_setting'].id,
-                    self.agents['workout_planning'].id,
-                    self.agents['daily_progress'].id
-                ]
-            )
-            
-            # Workout planning can handoff to related agents
-            client.beta.agents.update(
-                agent_id=self.agents['workout_planning'].id,
-                handoffs=[
-                    self.agents['food_recommendations'].id,
-                    self.agents['daily_progress'].id,
-                    self.agents['profile_management'].id
-                ]
-            )
-            
-            # Goal setting can handoff to related agents
-            client.beta.agents.update(
-                agent_id=self.agents['goal_setting'].id,
-                handoffs=[
-                    self.agents['food_logging'].id,
-                    self.agents['food_recommendations'].id,
-                    self.agents['daily_progress'].id,
-                    self.agents['web_search'].id,
-                    self.agents['workout_planning'].id
-                ]
-            )
-            
-            # Food logging can handoff to analysis agents
-            client.beta.agents.update(
-                agent_id=self.agents['food_logging'].id,
-                handoffs=[
-                    self.agents['food_recommendations'].id,
-                    self.agents['daily_progress'].id,
-                    self.agents['web_search'].id
-                ]
-            )
-            
-            # Food recommendations can handoff to progress tracking
-            client.beta.agents.update(
-                agent_id=self.agents['food_recommendations'].id,
-                handoffs=[
-                    self.agents['daily_progress'].id,
-                    self.agents['web_search'].id,
-                    self.agents['workout_planning'].id
-                ]
-            )
-            
-            # Web search can handoff to core agents
-            client.beta.agents.update(
-                agent_id=self.agents['web_search'].id,
-                handoffs=[
-                    self.agents['food_logging'].id,
-                    self.agents['goal_setting'].id,
-                    self.agents['daily_progress'].id,
-                    self.agents['workout_planning'].id
-                ]
-            )
-            
-            # Daily progress can handoff to recommendations and logging
-            client.beta.agents.update(
-                agent_id=self.agents['daily_progress'].id,
-                handoffs=[
-                    self.agents['food_recommendations'].id,
-                    self.agents['food_logging'].id,
-                    self.agents['workout_planning'].id
-                ]
-            )
+            await asyncio.gather(*(
+                asyncio.to_thread(
+                    client.beta.agents.update,
+                    agent_id=self.agents[source].id,
+                    handoffs=[self.agents[target].id for target in targets]
+                )
+                for source, targets in self.HANDOFFS.items()
+            ))
             
             logger.info("Agent handoffs configured successfully")
             
@@ -303,141 +341,374 @@ How would you like to start? You can try:
 """
     await cl.Message(content=welcome_message).send()
 
-async def handle_tool_execution(msg: cl.Message, tool_call_id: str, function_output: dict):
-    """Handle tool execution with improved error handling"""
+class TokenBuffer:
+    """Coalesces streamed tokens into fewer, larger WebSocket frames"""
+    
+    def __init__(self, msg: cl.Message, flush_interval: float = 0.03):
+        self.msg = msg
+        self.flush_interval = flush_interval
+        self._tokens = []
+        self._flusher_task = None
+        self._closed = False
+    
+    async def push(self, token: str):
+        """Queue a token; it is sent with the next periodic flush"""
+        self._tokens.append(token)
+        if self._flusher_task is None and not self._closed:
+            self._flusher_task = asyncio.create_task(self._flusher())
+    
+    async def flush(self):
+        """Send all queued tokens as a single frame"""
+        if self._tokens:
+            text = "".join(self._tokens)
+            self._tokens.clear()
+            await self.msg.stream_token(text)
+    
+    async def close(self):
+        """Stop the periodic flusher and send any remaining tokens"""
+        self._closed = True
+        # Let an in-flight flush finish rather than cancelling it: flush() has already
+        # taken the tokens out of the buffer by the time it awaits stream_token()
+        if self._flusher_task is not None:
+            await self._flusher_task
+        await self.flush()
+    
+    async def _flusher(self):
+        # Runs only while tokens are pending, so an abandoned buffer never leaks a task
+        try:
+            while self._tokens and not self._closed:
+                await asyncio.sleep(self.flush_interval)
+                await self.flush()
+        finally:
+            self._flusher_task = None
+
+@dataclass
+class TurnState:
+    """Mutable state collected while processing one turn's event stream"""
+    stream: TokenBuffer
+    conversation_id: Optional[str] = None  # captured from the first event of a new conversation
+    pending_calls: dict = field(default_factory=dict)  # tool_call_id -> {"name": ..., "arguments": [chunks]}
+    ref_index: dict = field(default_factory=dict)  # citation url -> citation number
+    cacheable: bool = True
+
+async def _handle_message_output(data: MessageOutputEvent, state: TurnState):
+    if isinstance(data.content, str):
+        await state.stream.push(data.content)
+    elif isinstance(data.content, list):
+        await state.stream.push(data.content[0].text)
+    elif isinstance(data.content, ToolReferenceChunk):
+        # Handle citations
+        tool_reference = data.content
+        idx = state.ref_index.setdefault(tool_reference.url, len(state.ref_index) + 1)
+        link_text = f" [{idx}]({tool_reference.url}) "
+        await state.stream.push(link_text)
+
+async def _handle_tool_started(data: ToolExecutionStartedEvent, state: TurnState):
+    await state.stream.push(f"🔧 **Using Tool:** `{data.name}`\n\n")
+
+async def _handle_handoff_done(data: AgentHandoffDoneEvent, state: TurnState):
+    await state.stream.push(f"🔄 **Routing to:** `{data.next_agent_name}`\n\n")
+
+async def _handle_function_call(data: FunctionCallEvent, state: TurnState):
+    function_output = state.pending_calls.setdefault(
+        data.tool_call_id, {"name": data.name, "arguments": []}
+    )
+    function_output["arguments"].append(data.arguments)
+
+async def _handle_response_error(data: ResponseErrorEvent, state: TurnState):
+    logger.error(f"Response error: {data.message}")
+    state.cacheable = False
+    await state.stream.push(f"\n\n❌ **Error:** {data.message}\n\n")
+
+# Event type -> handler, so each event costs one dict probe instead of an isinstance chain
+EVENT_HANDLERS = {
+    MessageOutputEvent: _handle_message_output,
+    ToolExecutionStartedEvent: _handle_tool_started,
+    AgentHandoffDoneEvent: _handle_handoff_done,
+    FunctionCallEvent: _handle_function_call,
+    ResponseErrorEvent: _handle_response_error,
+}
+
+async def consume_events(event_stream, state: TurnState):
+    """Dispatch every event of a stream to its handler"""
+    try:
+        async for event in event_stream:
+            if state.conversation_id is None:
+                state.conversation_id = getattr(event.data, "conversation_id", None)
+            handler = EVENT_HANDLERS.get(type(event.data))
+            if handler:
+                await handler(event.data, state)
+                
+    except ValidationError as e:
+        state.cacheable = False
+        logger.warning(f"ValidationError in event stream: {e}")
+        if "tool.execution.delta" in str(e):
+            logger.info("Handling unsupported tool.execution.delta event")
+            await state.stream.push(f"\n\n⚠️ **Processing...** (streaming in progress)\n\n")
+        else:
+            logger.error(f"Unexpected validation error: {e}")
+            await state.stream.push(f"\n\n❌ **Error:** Event validation failed. Please try again.\n\n")
+    
+    except Exception as e:
+        state.cacheable = False
+        logger.error(f"Unexpected error in event stream: {e}")
+        await state.stream.push(f"\n\n❌ **Error:** An unexpected error occurred. Please try again.\n\n")
+
+# Strong references to fire-and-forget tasks so they are not garbage collected mid-flight
+_background_tasks = set()
+
+def _record_memory(session_id: str, function_names: set):
+    """Add insights to memory based on the tools used in a turn"""
+    for function_name in function_names:
+        if function_name == "food_log":
+            memory_manager.add_dietary_insight(session_id, "User logged food intake", "food_logging")
+        elif function_name == "goal_setting":
+            memory_manager.add_user_preference(session_id, "User updated dietary goals", "goal_setting")
+        elif function_name == "workout_planning":
+            memory_manager.add_workout_preference(session_id, "User created workout plan", "workout_planning")
+
+def record_memory_in_background(session_id: str, function_names: set):
+    """Write memory insights off the response path"""
+    if not memory_manager.is_available() or not function_names:
+        return
+    task = asyncio.create_task(asyncio.to_thread(_record_memory, session_id, function_names))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+async def execute_tool_call(stream: TokenBuffer, function_name: str, arguments: str, session_id: str) -> tuple:
+    """Execute a single tool call in a worker thread. Returns (result, succeeded)."""
     try:
-        function_name = function_output["name"]
         if function_name not in agent_manager.function_tool_mapping:
             logger.error(f"Unknown function: {function_name}")
-            await msg.stream_token(f"\n\n❌ **Error:** Unknown function '{function_name}'\n\n")
-            return
+            await stream.push(f"\n\n❌ **Error:** Unknown function '{function_name}'\n\n")
+            return json.dumps({"status": "error", "message": f"Unknown function '{function_name}'"}), False
         
-        # Execute the function
-        result = agent_manager.function_tool_mapping[function_name](
-            **json.loads(function_output["arguments"])
-        )
+        kwargs = orjson.loads(arguments)
         
-        # Add insights to memory based on the tool used
-        session_id = cl.user_session.get("conversation_id", "default_session")
-        if memory_manager.is_available():
-            if function_name == "food_log":
-                memory_manager.add_dietary_insight(session_id, "User logged food intake", "food_logging")
-            elif function_name == "goal_setting":
-                memory_manager.add_user_preference(session_id, "User updated dietary goals", "goal_setting")
-            elif function_name == "workout_planning":
-                memory_manager.add_workout_preference(session_id, "User created workout plan", "workout_planning")
+        # Reuse a recent result if the user's data has not changed since
+        result = tool_cache.get(function_name, session_id, kwargs)
+        if result is not None:
+            await stream.push(f"✅ `{function_name}` done\n")
+            return result, True
         
-        # Create function result entry
-        user_entry = FunctionResultEntry(
-            tool_call_id=tool_call_id,
-            result=result,
+        # Execute the function off the event loop so calls can run concurrently
+        result = await asyncio.to_thread(
+            agent_manager.function_tool_mapping[function_name],
+            **kwargs
         )
+        tool_cache.set(function_name, session_id, kwargs, result)
+        
+        # Tools report their own failures (e.g. a search outage) as {"status": "error"}
+        if is_error_result(result):
+            await stream.push(f"⚠️ `{function_name}` reported an error\n")
+            return result, False
+        
+        await stream.push(f"✅ `{function_name}` done\n")
+        return result, True
+    
+    except Exception as e:
+        logger.error(f"Error executing {function_name}: {e}")
+        await stream.push(f"\n\n❌ **Error:** `{function_name}` failed. Please try again.\n\n")
+        return json.dumps({"status": "error", "message": f"Tool execution failed: {e}"}), False
+
+async def handle_tool_execution(state: TurnState, pending_calls: dict, conversation_id: str, session_id: str) -> bool:
+    """
+    Execute a round of tool calls concurrently and stream the follow-up through the
+    regular event handlers, so tool calls in the follow-up land in state.pending_calls.
+    Returns True on success.
+    """
+    stream = state.stream
+    try:
+        for function_output in pending_calls.values():
+            await stream.push(f"⏳ `{function_output['name']}` running...\n")
         
-        # Continue conversation with result
-        response = client.beta.conversations.append_stream(
-            conversation_id=cl.user_session.get("conversation_id"),
-            inputs=[user_entry],
+        results = await asyncio.gather(*(
+            execute_tool_call(stream, function_output["name"], "".join(function_output["arguments"]), session_id)
+            for function_output in pending_calls.values()
+        ))
+        
+        # Create function result entries in the order the model issued the calls
+        user_entries = [
+            FunctionResultEntry(tool_call_id=tool_call_id, result=result)
+            for tool_call_id, (result, _) in zip(pending_calls, results)
+        ]
+        
+        # Record one memory insight per tool kind used this turn, without delaying the reply
+        record_memory_in_background(session_id, {
+            function_output["name"]
+            for function_output, (_, succeeded) in zip(pending_calls.values(), results)
+            if succeeded
+        })
+        
+        # Continue conversation with all results at once
+        response = await client.beta.conversations.append_stream_async(
+            conversation_id=conversation_id,
+            inputs=user_entries,
         )
         
-        await msg.stream_token(f"\n\n")
+        await stream.push(f"\n\n")
+        
+        # Stream the response without blocking the event loop
+        async with response as event_stream:
+            await consume_events(event_stream, state)
         
-        # Stream the response
-        with response as event_stream:
-            for event in event_stream:
-                if isinstance(event.data, MessageOutputEvent):
-                    await msg.stream_token(event.data.content)
+        return all(succeeded for _, succeeded in results)
                     
     except Exception as e:
         logger.error(f"Error in tool execution: {e}")
-        await msg.stream_token(f"\n\n❌ **Error:** Tool execution failed. Please try again.\n\n")
+        await stream.push(f"\n\n❌ **Error:** Tool execution failed. Please try again.\n\n")
+        return False
+
+def _cached_turns_prefix(cached_turns: list) -> str:
+    """Replay of exchanges answered from the response cache, which the Mistral conversation never saw"""
+    if not cached_turns:
+        return ""
+    replay = "\n\n".join(f"User: {prompt}\nAssistant: {reply}" for prompt, reply in cached_turns)
+    return f"Earlier exchanges answered from cache:\n{replay}\n\n"
 
 @cl.on_message
 async def on_message(message: cl.Message):
     """Handle incoming messages with enhanced error handling"""
     try:
+        # Answer greetings, thanks and empty messages locally without a model round-trip
+        trivial = classify_trivial(message.content)
+        if trivial:
+            kind, canned_text = trivial
+            logger.debug(f"Answered trivial '{kind}' message locally")
+            await cl.Message(content=canned_text).send()
+            return
+        
         # Auto-detect and store user name if they introduce themselves
-        session_id = cl.user_session.get("conversation_id", "default_session")
-        auto_store_user_name(session_id, message.content)
+        conversation_id = cl.user_session.get("conversation_id")
+        session_id = conversation_id or "default_session"
+        if auto_store_user_name(session_id, message.content):
+            # The stored name changes what earlier answers should say
+            response_cache.invalidate(session_id)
+            llm_cache.invalidate(session_id)
+        
+        # Serve repeated queries from the response cache. Only established
+        # conversations are cached, since new ones share the default session id.
+        use_cache = conversation_id is not None
+        prompt_embedding = None
+        if use_cache:
+            cached_tokens = response_cache.get(session_id, message.content)
+            if cached_tokens is None and response_cache.has_entries(session_id):
+                prompt_embedding = await response_cache.embed(message.content)
+                cached_tokens = response_cache.get(session_id, message.content, prompt_embedding)
+            if cached_tokens is not None:
+                msg = cl.Message(content="")
+                for token in cached_tokens:
+                    await msg.stream_token(token)
+                    await asyncio.sleep(0)
+                await msg.update()
+                # Replay the exchange with the next model turn so the conversation stays in step
+                cached_turns = cl.user_session.get("cached_turns") or []
+                cached_turns.append((message.content, msg.content))
+                cl.user_session.set("cached_turns", cached_turns)
+                context_compressor.track(
+                    cl.user_session.get("active_conversation_id", conversation_id), message.content, msg.content
+                )
+                return
+        
+        # The Mistral conversation we append to can be replaced by a compressed one,
+        # while conversation_id stays the stable key for the user's stored data
+        active_conversation_id = cl.user_session.get("active_conversation_id", conversation_id)
+        summary = None
+        if active_conversation_id:
+            summary = await context_compressor.compress_if_needed(active_conversation_id)
+        
+        cached_turns = cl.user_session.get("cached_turns") or []
+        replay = _cached_turns_prefix(cached_turns)
+        
+        # Initialize message and tracking variables
+        msg = cl.Message(content="")
+        stream = TokenBuffer(msg)
+        state = TurnState(stream=stream, cacheable=use_cache)
+        
+        # Tool calls left over from an earlier turn's round limit must be answered first
+        unanswered_calls = cl.user_session.get("unanswered_calls") or []
         
         # Check if we have an existing conversation
-        if cl.user_session.get("conversation_id"):
-            conversation_id = cl.user_session.get("conversation_id")
-            logger.debug(f"Continuing conversation: {conversation_id}")
-            response = client.beta.conversations.append_stream(
-                conversation_id=conversation_id,
-                inputs=f"{message.content}",
+        if active_conversation_id and not summary:
+            state.conversation_id = active_conversation_id
+            logger.debug(f"Continuing conversation: {active_conversation_id}")
+            inputs = f"{replay}{message.content}"
+            if unanswered_calls:
+                inputs = [
+                    FunctionResultEntry(tool_call_id=tool_call_id, result=TOOL_ROUNDS_EXCEEDED_RESULT)
+                    for tool_call_id in unanswered_calls
+                ] + [MessageInputEntry(role="user", content=inputs)]
+            response = await client.beta.conversations.append_stream_async(
+                conversation_id=active_conversation_id,
+                inputs=inputs,
+            )
+        elif summary:
+            # Continue from a condensed summary in a fresh conversation with the router agent
+            response = await client.beta.conversations.start_stream_async(
+                agent_id=agent_manager.agents['router'].id,
+                inputs=f"Summary of our conversation so far:\n{summary}\n\n{replay}User message: {message.content}"
             )
         else:
             # Start new conversation with router agent
-            response = client.beta.conversations.start_stream(
+            response = await client.beta.conversations.start_stream_async(
                 agent_id=agent_manager.agents['router'].id,
-                inputs=message.content
+                inputs=f"{replay}{message.content}"
             )
         
-        # Initialize message and tracking variables
-        msg = cl.Message(content="")
-        tool_call_id = None
-        function_output = {"name": "", "arguments": ""}
-        ref_index = defaultdict(int)
-        counter = 1
+        # Process event stream without blocking the event loop for other sessions
+        async with response as event_stream:
+            await consume_events(event_stream, state)
+        if cached_turns:
+            cl.user_session.set("cached_turns", [])
+        if unanswered_calls:
+            # Answered above, or left behind with the conversation a summary replaced
+            cl.user_session.set("unanswered_calls", [])
         
-        # Process event stream
-        with response as event_stream:
-            # Get conversation ID
-            conversation_id = next(iter(event_stream)).data.conversation_id
-            logger.debug(f"Conversation ID: {conversation_id}")
-            cl.user_session.set("conversation_id", conversation_id)
-            
-            try:
-                for event in event_stream:
-                    # Handle different event types
-                    if isinstance(event.data, MessageOutputEvent):
-                        if isinstance(event.data.content, str):
-                            await msg.stream_token(event.data.content)
-                        elif isinstance(event.data.content, list):
-                            await msg.stream_token(event.data.content[0].text)
-                        elif isinstance(event.data.content, ToolReferenceChunk):
-                            # Handle citations
-                            tool_reference = event.data.content
-                            if tool_reference.url not in ref_index:
-                                ref_index[tool_reference.url] = counter
-                                counter += 1
-                            link_text = f" [{ref_index[tool_reference.url]}]({tool_reference.url}) "
-                            await msg.stream_token(link_text)
-                    
-                    elif isinstance(event.data, ToolExecutionStartedEvent):
-                        await msg.stream_token(f"🔧 **Using Tool:** `{event.data.name}`\n\n")
-                    
-                    elif isinstance(event.data, AgentHandoffDoneEvent):
-                        await msg.stream_token(f"🔄 **Routing to:** `{event.data.next_agent_name}`\n\n")
-                    
-                    elif isinstance(event.data, FunctionCallEvent):
-                        tool_call_id = event.data.tool_call_id
-                        function_output["name"] = event.data.name
-                        function_output["arguments"] += event.data.arguments
-                    
-                    elif isinstance(event.data, ResponseErrorEvent):
-                        logger.error(f"Response error: {event.data.message}")
-                        await msg.stream_token(f"\n\n❌ **Error:** {event.data.message}\n\n")
-                        
-            except ValidationError as e:
-                logger.warning(f"ValidationError in event stream: {e}")
-                if "tool.execution.delta" in str(e):
-                    logger.info("Handling unsupported tool.execution.delta event")
-                    await msg.stream_token(f"\n\n⚠️ **Processing...** (streaming in progress)\n\n")
-                else:
-                    logger.error(f"Unexpected validation error: {e}")
-                    await msg.stream_token(f"\n\n❌ **Error:** Event validation failed. Please try again.\n\n")
-            
-            except Exception as e:
-                logger.error(f"Unexpected error in event stream: {e}")
-                await msg.stream_token(f"\n\n❌ **Error:** An unexpected error occurred. Please try again.\n\n")
+        # Get conversation ID (captured from the first event for new conversations)
+        if state.conversation_id != active_conversation_id:
+            if summary and state.conversation_id:
+                # The summary now lives in the new conversation; stop tracking the old one
+                context_compressor.forget(active_conversation_id)
+            active_conversation_id = state.conversation_id
+            logger.debug(f"Conversation ID: {active_conversation_id}")
+            cl.user_session.set("active_conversation_id", active_conversation_id)
+            if conversation_id is None:
+                conversation_id = active_conversation_id
+                cl.user_session.set("conversation_id", conversation_id)
         
-        # Handle function calls
-        if tool_call_id:
-            await handle_tool_execution(msg, tool_call_id, function_output)
+        # Handle function calls. Follow-ups go through the same handlers on the pooled
+        # connection, so chained tool calls are served within this turn.
+        for _ in range(MAX_TOOL_ROUNDS):
+            if not state.pending_calls:
+                break
+            pending_calls, state.pending_calls = state.pending_calls, {}
+            succeeded = await handle_tool_execution(state, pending_calls, active_conversation_id, conversation_id)
+            if any(call["name"] in WRITE_TOOLS for call in pending_calls.values()):
+                # User data changed, so earlier cached answers may be stale
+                response_cache.invalidate(conversation_id)
+                llm_cache.invalidate(conversation_id)
+                state.cacheable = False
+            state.cacheable = state.cacheable and succeeded
         
+        if state.pending_calls:
+            # Out of rounds: tell the user, and answer the calls with errors on the next turn
+            # so the conversation is not left with function calls it cannot continue past
+            logger.warning(
+                f"Tool calls still pending after {MAX_TOOL_ROUNDS} rounds: "
+                f"{', '.join(call['name'] for call in state.pending_calls.values())}"
+            )
+            cl.user_session.set("unanswered_calls", list(state.pending_calls))
+            state.cacheable = False
+            await stream.push("\n\n⚠️ **Note:** I stopped after too many tool steps. Ask again to pick up where I left off.\n\n")
+        
+        await stream.close()
         await msg.update()
+        context_compressor.track(active_conversation_id, message.content, msg.content)
+        
+        if state.cacheable and msg.content:
+            if prompt_embedding is None:
+                prompt_embedding = await response_cache.embed(message.content)
+            response_cache.set(session_id, message.content, msg.content.splitlines(keepends=True), prompt_embedding)
         
     except Exception as e:
         logger.error(f"Error in message handling: {e}")
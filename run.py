@@ -30,6 +30,11 @@ def find_project_root():
 
 def check_environment():
     """Check if environment is properly configured"""
+    # Already configured (e.g. exported by a supervisor or a previous run) - skip .env parsing
+    api_key = os.environ.get("MISTRAL_API_KEY")
+    if api_key and api_key != "your-mistral-api-key-here":
+        return True
+    
     env_file = Path(".env")
     if not env_file.exists():
         print("❌ .env file not found!")
@@ -63,8 +68,12 @@ def main():
     """Main run function"""
     print("🍽️  Starting NutriSense Diet Companion...")
     
-    # Find and change to project root
-    project_root = find_project_root()
+    # Find and change to project root, reusing the root discovered by a previous run
+    cached_root = os.environ.get("NUTRISENSE_ROOT")
+    if cached_root and (Path(cached_root) / "agent.py").exists():
+        project_root = Path(cached_root)
+    else:
+        project_root = find_project_root()
     if not project_root:
         print("❌ Could not find project root directory!")
         print("Please make sure you're running this script from the correct location.")
@@ -72,6 +81,7 @@ def main():
         sys.exit(1)
     
     print(f"📁 Project root: {project_root}")
+    os.environ["NUTRISENSE_ROOT"] = str(project_root)
     os.chdir(project_root)
     
     # Check environment
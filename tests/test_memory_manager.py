@@ -0,0 +1,77 @@
+"""
+Tests for the empty-user shortcut in PersonalizedMemoryManager
+"""
+
+import pytest
+
+from tools.memory_manager import PersonalizedMemoryManager
+
+
+class FakeMem0:
+    """In-memory stand-in for MemoryClient that counts reads"""
+
+    def __init__(self):
+        self.memories = {}
+        self.searches = 0
+        self.listings = 0
+
+    def search(self, query, user_id, limit):
+        self.searches += 1
+        return self.memories.get(user_id, [])[:limit]
+
+    def get_all(self, user_id, limit):
+        self.listings += 1
+        return self.memories.get(user_id, [])[:limit]
+
+    def add(self, messages, user_id, metadata=None):
+        self.memories.setdefault(user_id, []).append({"memory": messages[0]["content"]})
+        return {"id": len(self.memories[user_id])}
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    manager = PersonalizedMemoryManager()
+    manager.memory_client = FakeMem0()
+    # Run background probes inline so the test sees their effect
+    monkeypatch.setattr(manager, "submit", lambda fn, *args, **kwargs: fn(*args, **kwargs))
+    return manager
+
+
+def test_empty_user_skips_mem0_after_probe(manager):
+    assert manager.get_user_memories("u1", "diet") == []
+    assert manager.memory_client.listings == 1
+
+    assert manager.get_user_memories("u1", "workout") == []
+    assert manager.memory_client.searches == 1
+
+
+def test_probe_write_read_reaches_new_memory(manager):
+    manager.get_user_memories("u1", "diet")
+    assert "u1" in manager._empty_users
+
+    manager.add_user_preference("u1", "vegetarian")
+
+    assert manager.get_user_memories("u1", "diet")
+    assert manager.memory_client.searches == 2
+
+
+def test_no_empty_mark_inside_write_grace_window(manager):
+    # mem0 has not ingested the queued write yet, so reads still come back empty
+    manager._writer = object()
+    manager.enqueue_add("u1", "likes oats")
+
+    manager.get_user_memories("u1", "diet")
+    manager.get_user_memories("u1", "")
+
+    assert "u1" not in manager._empty_users
+    assert manager.get_user_memories("u1", "lunch") == []
+    assert manager.memory_client.searches == 2
+
+
+def test_empty_mark_expires(manager):
+    manager.get_user_memories("u1", "diet")
+    manager.memory_client.memories["u1"] = [{"memory": "added by another worker"}]
+
+    manager._empty_users.expire(manager._empty_users.timer() + 3600)
+
+    assert manager.get_user_memories("u1", "breakfast")
@@ -0,0 +1,65 @@
+"""
+Tests for profile updates in the profile management tool
+"""
+
+import pytest
+
+from tools import profile_management_tool
+
+
+class FakeDataManager:
+    """Records profile writes instead of touching SQLite"""
+
+    def __init__(self):
+        self.upserts = []
+
+    def update_user_profile(self, session_id, profile):
+        self.upserts.append((session_id, profile))
+        return True
+
+    def update_session_activity(self, session_id):
+        pass
+
+
+@pytest.fixture
+def data_manager(monkeypatch):
+    data_manager = FakeDataManager()
+    monkeypatch.setattr(profile_management_tool, "get_data_manager", lambda: data_manager)
+    return data_manager
+
+
+@pytest.fixture
+def enqueued(monkeypatch):
+    enqueued = []
+    memory_manager = profile_management_tool.memory_manager
+    monkeypatch.setattr(memory_manager, "is_available", lambda: True)
+    monkeypatch.setattr(memory_manager, "get_user_memories", lambda *args, **kwargs: [])
+    monkeypatch.setattr(memory_manager, "enqueue_items", lambda *args: enqueued.append(args))
+    return enqueued
+
+
+PROFILE = {
+    "user_name": "Mihir",
+    "weight": 70.0,
+    "height": 175.0,
+    "age": 25,
+    "gender": "male",
+    "updated_at": "2026-01-01T08:00:00",
+}
+
+
+def test_all_none_update_returns_view_without_writes(data_manager, enqueued):
+    updates = {"user_name": None, "weight": None, "height": None, "age": None}
+
+    result = profile_management_tool.update_profile("s1", PROFILE, updates)
+
+    assert result == profile_management_tool.view_profile("s1", PROFILE)
+    assert data_manager.upserts == []
+    assert enqueued == []
+
+
+def test_update_writes_profile_and_enqueues_memories(data_manager, enqueued):
+    profile_management_tool.update_profile("s1", PROFILE, {"weight": 72.0, "age": None})
+
+    assert [profile["weight"] for _, profile in data_manager.upserts] == [72.0]
+    assert len(enqueued) == 1
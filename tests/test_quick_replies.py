@@ -0,0 +1,23 @@
+"""
+Tests for locally answered trivial messages
+"""
+
+import pytest
+
+from tools.quick_replies import classify_trivial
+
+
+@pytest.mark.parametrize("text, kind", [
+    ("", "empty"),
+    ("👍", "empty"),
+    ("Hello there!", "greeting"),
+    ("thank you so much", "thanks"),
+    ("Damn!!", "profanity"),
+    ("wtf, screw this", "profanity"),
+    ("screw this!", "profanity"),
+    ("shit, I ate a whole pizza", None),
+    ("hi, I had eggs for breakfast", None),
+])
+def test_classify_trivial(text, kind):
+    result = classify_trivial(text)
+    assert (result[0] if result else None) == kind
@@ -0,0 +1,60 @@
+"""
+Tests for the pooled Exa client used by the web search tool
+"""
+
+import exa_py
+import pytest
+import requests
+
+from tools import web_search_tool
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, payload=None):
+        self.status_code = status_code
+        self.payload = payload or {"requestId": "r1", "results": [{"id": "1", "url": "https://example.com", "title": "Oats"}]}
+        self.text = "error body"
+
+    def json(self):
+        return self.payload
+
+
+@pytest.fixture
+def exa(monkeypatch):
+    exa = web_search_tool.PooledExa("test-key")
+    calls = []
+
+    def request(method, url, **kwargs):
+        calls.append((method, url, kwargs["headers"]["x-api-key"]))
+        return exa.next_response
+
+    def unpooled(*args, **kwargs):
+        raise AssertionError("Exa request bypassed the pooled session")
+
+    exa.calls = calls
+    exa.next_response = FakeResponse()
+    monkeypatch.setattr(exa.session, "request", request)
+    for verb in ("get", "post"):
+        monkeypatch.setattr(requests, verb, unpooled)
+    return exa
+
+
+def test_search_goes_through_pooled_session(exa):
+    # Fails if exa_py stops routing searches through Exa.request
+    response = exa.search("oats", num_results=1)
+
+    assert [result.url for result in response.results] == ["https://example.com"]
+    assert exa.calls == [("POST", "https://api.exa.ai/search", "test-key")]
+
+
+def test_error_status_keeps_exa_message(exa):
+    exa.next_response = FakeResponse(status_code=429)
+
+    with pytest.raises(ValueError) as error:
+        exa.search("oats", num_results=1)
+
+    assert web_search_tool.is_retryable(error.value)
+
+
+def test_exa_module_is_not_patched(exa):
+    assert exa_py.api.requests is requests
@@ -0,0 +1,13 @@
+"""
+Environment loading for NutriSense Diet Companion
+Parses the .env file once per process and exposes a read-only snapshot
+"""
+
+import os
+from types import MappingProxyType
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Read-only snapshot of the environment after .env has been applied
+ENV = MappingProxyType(dict(os.environ))
@@ -0,0 +1,12 @@
+"""
+JSON helpers for NutriSense Diet Companion
+Fast orjson-backed serialization for tool responses and prompts
+"""
+
+import orjson
+
+def dumps(obj, indent: bool = True) -> str:
+    """Serialize to a JSON string, pretty-printed with two spaces unless indent is False"""
+    return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0).decode()
+
+loads = orjson.loads
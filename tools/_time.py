@@ -0,0 +1,21 @@
+"""
+Timestamp helpers for NutriSense Diet Companion
+Second-resolution local timestamps, formatted at most once per second
+"""
+
+import time
+from datetime import datetime
+
+# (epoch second, ISO string) of the last timestamp formatted; swapped as one tuple so
+# concurrent callers never see a mismatched pair
+_iso_now_cache = (0, "")
+
+def iso_now(sep: str = "T") -> str:
+    """Current local time as an ISO string at second resolution"""
+    global _iso_now_cache
+    now = int(time.time())
+    second, text = _iso_now_cache
+    if now != second:
+        text = datetime.fromtimestamp(now).isoformat()
+        _iso_now_cache = (now, text)
+    return text if sep == "T" else text.replace("T", sep, 1)
@@ -1,16 +1,29 @@
+import httpx
 from mistralai import Mistral
-from dotenv import load_dotenv
-import os
-
-load_dotenv()
+from ._env import ENV
 
 # Mistral model configuration
 mistral_model = "mistral-medium-2505"
 
-# Mistral client
-client = Mistral(api_key=os.environ.get("MISTRAL_API_KEY"))
+MISTRAL_API_KEY = ENV.get("MISTRAL_API_KEY")
+
+# Connection pool shared by every thread/task that talks to Mistral. Idle connections
+# are kept for a minute (httpx defaults to 5s) so the pause between two chat turns
+# does not cost a fresh TCP + TLS handshake.
+HTTP_TIMEOUT = 30
+HTTP_KEEPALIVE_EXPIRY = 60
+HTTP_LIMITS = httpx.Limits(
+    max_connections=64, max_keepalive_connections=32, keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+)
+
+# Mistral client (sync calls from tool threads, async calls from the event loop)
+client = Mistral(
+    api_key=MISTRAL_API_KEY,
+    client=httpx.Client(http2=True, timeout=HTTP_TIMEOUT, limits=HTTP_LIMITS),
+    async_client=httpx.AsyncClient(http2=True, timeout=HTTP_TIMEOUT, limits=HTTP_LIMITS),
+)
 
 # Environment check
-if not os.environ.get("MISTRAL_API_KEY"):
+if not MISTRAL_API_KEY:
     print("⚠️  Warning: MISTRAL_API_KEY not found in environment variables")
-    print("Please ensure your .env file contains the API key")
\ No newline at end of file
+    print("Please ensure your .env file contains the API key")
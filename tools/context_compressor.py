@@ -0,0 +1,92 @@
+"""
+Context Compressor for NutriSense Diet Companion
+Condenses long conversations so later turns and handoffs carry fewer prompt tokens
+"""
+
+from typing import Optional
+from cachetools import TTLCache
+from loguru import logger
+
+from .configs import client
+
+SUMMARY_MODEL = "mistral-small-latest"
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (~4 characters per token)"""
+    return len(text) // 4
+
+class ContextCompressor:
+    """
+    Tracks an estimated prompt size per conversation and, once it crosses the
+    token budget, summarizes the history so a fresh conversation can continue
+    from the summary instead of the full transcript.
+    """
+
+    def __init__(self, threshold: int = 3000, max_conversations: int = 4096, idle_seconds: int = 86400):
+        self.threshold = threshold
+        # Bounded so abandoned conversations do not accumulate; idle ones are dropped after a day
+        self.token_estimates = TTLCache(maxsize=max_conversations, ttl=idle_seconds)
+
+    def track(self, conversation_id: str, *texts: str):
+        """Add the text exchanged in a turn to the conversation's token estimate"""
+        self.token_estimates[conversation_id] = self.token_estimates.get(conversation_id, 0) + sum(
+            estimate_tokens(text) for text in texts if text
+        )
+
+    def forget(self, conversation_id: str):
+        """Stop tracking a conversation (e.g. after it has been replaced)"""
+        self.token_estimates.pop(conversation_id, None)
+
+    async def _get_transcript(self, conversation_id: str) -> str:
+        """Fetch the conversation history as plain text"""
+        history = await client.beta.conversations.get_history_async(conversation_id=conversation_id)
+        lines = []
+        for entry in history.entries:
+            text = getattr(entry, "content", None) or getattr(entry, "result", None)
+            if isinstance(text, list):
+                text = " ".join(getattr(chunk, "text", "") for chunk in text)
+            if text:
+                lines.append(f"{getattr(entry, 'role', None) or entry.type}: {text}")
+        return "\n".join(lines)
+
+    async def compress_if_needed(self, conversation_id: str) -> Optional[str]:
+        """Return a condensed summary of the conversation if it exceeds the token budget"""
+        if self.token_estimates.get(conversation_id, 0) < self.threshold:
+            return None
+
+        try:
+            transcript = await self._get_transcript(conversation_id)
+
+            # The local estimate does not see tool results; recalibrate from the real history
+            actual_tokens = estimate_tokens(transcript)
+            if actual_tokens < self.threshold:
+                self.token_estimates[conversation_id] = actual_tokens
+                return None
+
+            response = await client.chat.complete_async(
+                model=SUMMARY_MODEL,
+                messages=[
+                    {
+                        "role": "system",
+                        "content": """Summarize this conversation between a user and a nutrition and fitness assistant.
+                        Keep the user's goals, profile stats, preferences, recently logged foods and any open requests.
+                        Drop greetings, routing messages and repeated information. Be concise."""
+                    },
+                    {"role": "user", "content": transcript}
+                ],
+                max_tokens=400,
+                temperature=0
+            )
+
+            summary = response.choices[0].message.content
+            logger.info(f"Compressed conversation {conversation_id} from ~{actual_tokens} tokens")
+            return summary
+
+        except Exception as e:
+            logger.error(f"Error compressing conversation context: {e}")
+            # Back off instead of retrying on every turn
+            self.token_estimates[conversation_id] = 0
+            return None
+
+# Create global instance
+context_compressor = ContextCompressor()
@@ -1,12 +1,11 @@
-from dotenv import load_dotenv
-import json
+from ._json import dumps
+from ._time import iso_now
 import chainlit as cl
-from .configs import mistral_model, client
-from .data_manager import data_manager
+from .llm_cache import cached_complete, state_hash, streamed_step
+from .data_manager import GOAL_KEYS, get_data_manager
 from loguru import logger
 from datetime import datetime
-
-load_dotenv()
+from typing import Dict, Optional
 
 DAILY_PROGRESS_TOOL = {
     "type": "function",
@@ -26,6 +25,30 @@ DAILY_PROGRESS_TOOL = {
     },
 }
 
+# Per-item detail the narrative needs; totals cover the rest of the day
+RECENT_LOGS_IN_PROMPT = 5
+
+def start_of_today() -> int:
+    """Local midnight as unix seconds, the unit food_logs.logged_at is stored in"""
+    midnight = datetime.now().astimezone().replace(hour=0, minute=0, second=0, microsecond=0)
+    return int(midnight.timestamp())
+
+def _to_number(value) -> Optional[float]:
+    """Parse a stored goal value, treating unset or non-numeric values as missing"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def goal_progress(totals: Dict[str, int], goals: Dict[str, str]) -> Dict[str, int]:
+    """Percentage of each numeric goal reached by the totals"""
+    progress = {}
+    for key in GOAL_KEYS:
+        goal = _to_number(goals.get(key))
+        if key in totals and goal:
+            progress[key] = round(100 * totals[key] / goal)
+    return progress
+
 def daily_progress(user_query: str) -> str:
     """
     Provide daily progress of the user based on their goals and food intake.
@@ -39,46 +62,37 @@ def daily_progress(user_query: str) -> str:
     try:
         # Get current session ID
         session_id = cl.user_session.get("conversation_id", "default_session")
+        data_manager = get_data_manager()
         
-        # Get user's goals and food logs
+        # Get user's goals, today's totals (summed in SQL) and the latest few logs for detail
+        since = start_of_today()
         goals = data_manager.get_goals(session_id)
-        food_logs = data_manager.get_food_logs(session_id, limit=20)  # Get today's logs
+        totals = data_manager.get_daily_totals(session_id, since)
+        food_logs = data_manager.get_food_logs_since(session_id, since, limit=RECENT_LOGS_IN_PROMPT)
         
         # Update session activity
         data_manager.update_session_activity(session_id)
         
         # Prepare context for analysis
-        goals_summary = {
-            "calories": goals.get("calories", "Not set"),
-            "protein": goals.get("protein", "Not set"),
-            "carbs": goals.get("carbs", "Not set"),
-            "fat": goals.get("fat", "Not set")
-        }
+        goals_summary = {key: goals.get(key) or "Not set" for key in GOAL_KEYS}
         
-        # Format food logs for analysis
-        foods_summary = []
-        for log in food_logs:
-            foods_summary.append({
-                "food": log.get("food_item", "Unknown"),
-                "meal_type": log.get("meal_type", "Unknown"),
-                "quantity": log.get("quantity", "Unknown"),
-                "calories": log.get("calories_estimated", 0),
-                "time": log.get("logged_at", "Unknown")
-            })
+        # Numbers are computed here so the model only writes the narrative
+        progress = goal_progress(totals, goals)
         
         # Create comprehensive prompt
         prompt = f"""
         You are a nutrition analysis assistant. Provide an insightful analysis of the user's food logs.
 
-        User's Goals: {json.dumps(goals_summary, indent=2)}
-        Today's Food Logs: {json.dumps(foods_summary, indent=2)}
+        User's Goals: {dumps(goals_summary, indent=False)}
+        Today's Totals: {dumps(totals, indent=False)}
+        Progress (% of goal): {dumps(progress, indent=False)}
+        Most Recent Foods Today: {dumps(food_logs, indent=False)}
 
+        The totals and percentages above are exact; quote them as given and do not recompute them.
         Analyze the following:
-        1. Total calories and macronutrients consumed today
-        2. Progress towards daily goals (percentage completed)
-        3. Identify nutritional strengths or gaps
-        4. Provide helpful insights based on eating patterns
-        5. Suggest improvements if needed
+        1. Identify nutritional strengths or gaps
+        2. Provide helpful insights based on eating patterns
+        3. Suggest improvements if needed
 
         Special cases:
         - If no food logs: Suggest they log some meals first
@@ -92,34 +106,33 @@ def daily_progress(user_query: str) -> str:
         User Query: {user_query}
         """
         
-        # Get AI analysis
-        response = client.chat.complete(
-            model=mistral_model,
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=500,
-            temperature=0.3
-        )
-        
-        analysis = response.choices[0].message.content
+        # Get AI analysis (reused while goals and logs are unchanged)
+        with streamed_step("daily_progress") as on_token:
+            analysis = cached_complete(
+                "daily_progress", session_id, state_hash(goals_summary, totals, food_logs), user_query, prompt,
+                on_token=on_token
+            )
         
         # Structure the response
         result = {
             "status": "success",
             "message": analysis,
             "summary": {
-                "goals_set": any(v != "Not set" for v in goals_summary.values()),
-                "foods_logged": len(foods_summary),
-                "last_update": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                "goals_set": any(goals.get(key) for key in GOAL_KEYS),
+                "foods_logged": totals["foods_logged"],
+                "totals": totals,
+                "progress": progress,
+                "last_update": iso_now(sep=" ")
             }
         }
         
-        logger.info(f"Daily progress generated for session {session_id}: {len(foods_summary)} food logs analyzed")
-        return json.dumps(result, indent=2)
+        logger.info(f"Daily progress generated for session {session_id}: {totals['foods_logged']} food logs analyzed")
+        return dumps(result)
         
     except Exception as e:
         logger.error(f"Error in daily_progress: {e}")
-        return json.dumps({
+        return dumps({
             "status": "error",
             "message": "An error occurred while analyzing your progress. Please try again.",
             "error": str(e)
-        }, indent=2)
\ No newline at end of file
+        })
\ No newline at end of file
@@ -3,111 +3,373 @@ Data Manager for NutriSense Diet Companion
 Handles persistent storage of user data using SQLite database
 """
 
+import atexit
 import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import json
 import os
 from datetime import datetime
 from typing import Dict, List, Optional, Any
 from pathlib import Path
 from loguru import logger
+from ._singleflight import SingleFlight
+
+# SQL statements are module-level constants so the connection's statement cache
+# gets a hit on every call instead of re-parsing the query text
+_SQL_GET_GOALS = '''
+    SELECT COALESCE(calories, '') AS calories, COALESCE(protein, '') AS protein,
+           COALESCE(carbs, '') AS carbs, COALESCE(fat, '') AS fat
+    FROM goals
+    WHERE user_session = ?
+'''
+
+_SQL_UPSERT_GOALS = '''
+    INSERT INTO goals
+    (user_session, calories, protein, carbs, fat, updated_at)
+    VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+    ON CONFLICT(user_session) DO UPDATE SET
+        calories = excluded.calories,
+        protein = excluded.protein,
+        carbs = excluded.carbs,
+        fat = excluded.fat,
+        updated_at = excluded.updated_at
+'''
+
+_SQL_INSERT_FOOD_LOG = '''
+    INSERT INTO food_logs
+    (user_session, food_item, meal_type, quantity, calories_estimated)
+    VALUES (?, ?, ?, ?, ?)
+'''
+
+# food_logs.logged_at holds integer unix seconds (portable spelling of unixepoch())
+_SQL_NOW_EPOCH = "CAST(strftime('%s', 'now') AS INTEGER)"
+
+# Food log columns are aliased to the keys the prompts embed so callers can pass rows through unchanged
+_SQL_GET_FOOD_LOGS = '''
+    SELECT food_item AS food, meal_type, quantity, calories_estimated AS calories,
+           datetime(logged_at, 'unixepoch', 'localtime') AS time
+    FROM food_logs
+    WHERE user_session = ?
+    ORDER BY logged_at DESC
+    LIMIT ?
+'''
+
+_SQL_GET_FOOD_LOGS_SINCE = '''
+    SELECT food_item AS food, meal_type, quantity, calories_estimated AS calories,
+           datetime(logged_at, 'unixepoch', 'localtime') AS time
+    FROM food_logs
+    WHERE user_session = ? AND logged_at >= ?
+    ORDER BY logged_at DESC
+    LIMIT ?
+'''
+
+_SQL_GET_FOOD_TOTALS_SINCE = '''
+    SELECT COALESCE(SUM(calories_estimated), 0) AS calories, COUNT(*) AS foods_logged
+    FROM food_logs
+    WHERE user_session = ? AND logged_at >= ?
+'''
+
+_SQL_UPSERT_SESSION = '''
+    INSERT OR REPLACE INTO user_sessions
+    (session_id, last_activity)
+    VALUES (?, CURRENT_TIMESTAMP)
+'''
+
+_SQL_GET_PROFILE = '''
+    SELECT user_name, weight, height, age, gender, activity_level, fitness_experience,
+           health_conditions, dietary_preferences, food_allergies,
+           workout_preferences, equipment_access, updated_at
+    FROM user_profiles
+    WHERE user_session = ?
+'''
+
+_SQL_UPSERT_PROFILE = '''
+    INSERT OR REPLACE INTO user_profiles
+    (user_session, user_name, weight, height, age, gender, activity_level,
+     fitness_experience, health_conditions, dietary_preferences,
+     food_allergies, workout_preferences, equipment_access, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+'''
+
+# Columns of a goals row, in the order the tools present them
+GOAL_KEYS = ("calories", "protein", "carbs", "fat")
+
+# Bumped whenever init_database's DDL or migrations change; stored in PRAGMA user_version
+CURRENT_SCHEMA_VERSION = 2
+
+# Schema for a fresh (or already migrated) database. Run as a single script inside one
+# BEGIN IMMEDIATE transaction so concurrent workers cannot interleave setup.
+_SCHEMA_DDL = f'''
+    BEGIN IMMEDIATE;
+
+    -- One row of goals per session
+    CREATE TABLE IF NOT EXISTS goals (
+        user_session TEXT PRIMARY KEY,
+        calories TEXT,
+        protein TEXT,
+        carbs TEXT,
+        fat TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+
+    CREATE TABLE IF NOT EXISTS food_logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_session TEXT NOT NULL,
+        food_item TEXT NOT NULL,
+        meal_type TEXT,
+        quantity TEXT,
+        calories_estimated INTEGER,
+        logged_at INTEGER NOT NULL DEFAULT ({_SQL_NOW_EPOCH})
+    );
+
+    CREATE TABLE IF NOT EXISTS user_sessions (
+        session_id TEXT PRIMARY KEY,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        last_activity TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+
+    CREATE TABLE IF NOT EXISTS user_profiles (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_session TEXT NOT NULL UNIQUE,
+        user_name TEXT,
+        weight REAL,
+        height REAL,
+        age INTEGER,
+        gender TEXT,
+        activity_level TEXT,
+        fitness_experience TEXT,
+        health_conditions TEXT,
+        dietary_preferences TEXT,
+        food_allergies TEXT,
+        workout_preferences TEXT,
+        equipment_access TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+
+    -- Per-session "latest logs first" lookups (goals and user_profiles are keyed by user_session already)
+    CREATE INDEX IF NOT EXISTS idx_food_logs_session_time
+    ON food_logs(user_session, logged_at DESC);
+
+    PRAGMA user_version = {CURRENT_SCHEMA_VERSION};
+
+    COMMIT;
+'''
+
+# Sessions whose goals/profile are kept in memory (least recently used are evicted)
+_READ_CACHE_SIZE = 1024
+
+# Minimum seconds between two last_activity writes for the same session
+SESSION_ACTIVITY_INTERVAL = 10
 
 class DataManager:
     def __init__(self, db_path: str = "nutrisense_data.db"):
         self.db_path = db_path
+        # Per-session data version, bumped on every write so caches can detect stale reads
+        self._versions: Dict[str, int] = {}
+        # LRU caches for the rarely-changing rows read on almost every tool call
+        self._goals_cache: "OrderedDict[str, Dict[str, str]]" = OrderedDict()
+        self._profile_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        # Coalesces concurrent cache misses for the same row into one query
+        self._flights = SingleFlight()
+        # Monotonic time of the last queued activity write per session (throttles the writes)
+        self._activity_written: Dict[str, float] = {}
+        # One long-lived write connection shared by all threads, serialized by the lock
+        self._lock = threading.Lock()
+        self._conn = self._connect()
+        # Readers use a connection per thread: WAL isolates connections, not cursors, so a
+        # read on the write connection could see another thread's uncommitted transaction
+        self._local = threading.local()
+        self._readers: List[sqlite3.Connection] = []
+        # Off-the-critical-path writes (session bookkeeping) that callers never wait on
+        self._background = ThreadPoolExecutor(max_workers=2, thread_name_prefix="data-manager")
+        atexit.register(self._shutdown)
         self.init_database()
     
+    def _shutdown(self):
+        """Drain pending background writes, refresh planner statistics, then close the connection"""
+        self._background.shutdown(wait=True)
+        # Re-analyzes only tables whose size changed a lot, so index choices track real data
+        self._conn.execute("PRAGMA optimize")
+        self._conn.close()
+        with self._cache_lock:
+            for reader in self._readers:
+                reader.close()
+            self._readers.clear()
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Open the shared connection in autocommit mode with WAL journaling"""
+        conn = sqlite3.connect(
+            self.db_path, check_same_thread=False, isolation_level=None, cached_statements=128
+        )
+        # Rows convert to dicts in C via dict(row)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-20000")
+        return conn
+    
+    def _reader(self) -> sqlite3.Connection:
+        """This thread's read-only connection, opened on first use"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            conn.execute("PRAGMA query_only=ON")
+            self._local.conn = conn
+            with self._cache_lock:
+                self._readers.append(conn)
+        return conn
+    
     def init_database(self):
         """Initialize the database with required tables"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                
-                # Create goals table
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS goals (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        user_session TEXT NOT NULL,
-                        calories TEXT,
-                        protein TEXT,
-                        carbs TEXT,
-                        fat TEXT,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
+            with self._lock:
+                cursor = self._conn.cursor()
                 
-                # Create food logs table
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS food_logs (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        user_session TEXT NOT NULL,
-                        food_item TEXT NOT NULL,
-                        meal_type TEXT,
-                        quantity TEXT,
-                        calories_estimated INTEGER,
-                        logged_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
+                # Already set up by this or another worker: nothing to create or migrate
+                schema_version = cursor.execute("PRAGMA user_version").fetchone()[0]
+                if schema_version >= CURRENT_SCHEMA_VERSION:
+                    return
                 
-                # Create user sessions table
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS user_sessions (
-                        session_id TEXT PRIMARY KEY,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        last_activity TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
+                # Goals used to keep every update as a new row; collapse to one row per session
+                goal_columns = {row["name"] for row in cursor.execute("PRAGMA table_info(goals)")}
+                if "id" in goal_columns:
+                    self._migrate_goals(cursor)
                 
-                # Create user profiles table
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS user_profiles (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        user_session TEXT NOT NULL UNIQUE,
-                        user_name TEXT,
-                        weight REAL,
-                        height REAL,
-                        age INTEGER,
-                        gender TEXT,
-                        activity_level TEXT,
-                        fitness_experience TEXT,
-                        health_conditions TEXT,
-                        dietary_preferences TEXT,
-                        food_allergies TEXT,
-                        workout_preferences TEXT,
-                        equipment_access TEXT,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
+                # Food log times used to be CURRENT_TIMESTAMP strings; convert to unix seconds
+                food_log_types = {row["name"]: row["type"] for row in cursor.execute("PRAGMA table_info(food_logs)")}
+                if food_log_types.get("logged_at", "INTEGER") != "INTEGER":
+                    self._migrate_food_log_times(cursor)
                 
-                conn.commit()
+                # Create all tables and indexes in one script and one write transaction
+                try:
+                    cursor.executescript(_SCHEMA_DDL)
+                except Exception:
+                    if self._conn.in_transaction:
+                        cursor.execute("ROLLBACK")
+                    raise
                 logger.info("Database initialized successfully")
         except Exception as e:
             logger.error(f"Error initializing database: {e}")
             raise
     
+    @staticmethod
+    def _migrate_goals(cursor: sqlite3.Cursor):
+        """Rebuild the goals history table keeping only the latest row per session"""
+        cursor.execute("BEGIN")
+        try:
+            cursor.execute('''
+                CREATE TABLE goals_new (
+                    user_session TEXT PRIMARY KEY,
+                    calories TEXT,
+                    protein TEXT,
+                    carbs TEXT,
+                    fat TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            cursor.execute('''
+                INSERT INTO goals_new
+                SELECT user_session, calories, protein, carbs, fat, created_at, updated_at
+                FROM goals AS g
+                WHERE id = (
+                    SELECT id FROM goals
+                    WHERE user_session = g.user_session
+                    ORDER BY updated_at DESC, id DESC
+                    LIMIT 1
+                )
+            ''')
+            cursor.execute("DROP TABLE goals")
+            cursor.execute("ALTER TABLE goals_new RENAME TO goals")
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+        logger.info("Migrated goals table to one row per session")
+    
+    @staticmethod
+    def _migrate_food_log_times(cursor: sqlite3.Cursor):
+        """Rebuild food_logs with integer unix-second timestamps"""
+        cursor.execute("BEGIN")
+        try:
+            cursor.execute('''
+                CREATE TABLE food_logs_new (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_session TEXT NOT NULL,
+                    food_item TEXT NOT NULL,
+                    meal_type TEXT,
+                    quantity TEXT,
+                    calories_estimated INTEGER,
+                    logged_at INTEGER NOT NULL DEFAULT (''' + _SQL_NOW_EPOCH + ''')
+                )
+            ''')
+            cursor.execute('''
+                INSERT INTO food_logs_new
+                SELECT id, user_session, food_item, meal_type, quantity, calories_estimated,
+                       COALESCE(CAST(strftime('%s', logged_at) AS INTEGER), ''' + _SQL_NOW_EPOCH + ''')
+                FROM food_logs
+            ''')
+            cursor.execute("DROP TABLE food_logs")
+            cursor.execute("ALTER TABLE food_logs_new RENAME TO food_logs")
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+        logger.info("Migrated food log timestamps to unix seconds")
+    
+    def version(self, session_id: str) -> int:
+        """Get the current data version for a session"""
+        return self._versions.get(session_id, 0)
+    
+    def _bump_version(self, session_id: str):
+        """Mark a session's data as changed"""
+        self._versions[session_id] = self._versions.get(session_id, 0) + 1
+    
+    def _cache_get(self, cache: OrderedDict, session_id: str) -> Optional[Dict]:
+        """Get a copy of a cached row, marking it most recently used"""
+        with self._cache_lock:
+            value = cache.get(session_id)
+            if value is None:
+                return None
+            cache.move_to_end(session_id)
+            return dict(value)
+    
+    def _cache_put(self, cache: OrderedDict, session_id: str, value: Dict, version: Optional[int] = None):
+        """Cache a row, evicting the least recently used session when full.
+        
+        Readers pass the data version seen before their query so a row read
+        concurrently with a write is not cached over the newer one.
+        """
+        with self._cache_lock:
+            if version is not None and version != self.version(session_id):
+                return
+            cache[session_id] = dict(value)
+            cache.move_to_end(session_id)
+            if len(cache) > _READ_CACHE_SIZE:
+                cache.popitem(last=False)
+    
     def get_goals(self, session_id: str) -> Dict[str, str]:
         """Get user goals for a session"""
+        cached = self._cache_get(self._goals_cache, session_id)
+        if cached is not None:
+            return cached
+        version = self.version(session_id)
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    SELECT calories, protein, carbs, fat 
-                    FROM goals 
-                    WHERE user_session = ? 
-                    ORDER BY updated_at DESC 
-                    LIMIT 1
-                ''', (session_id,))
-                
-                result = cursor.fetchone()
-                if result:
-                    return {
-                        "calories": result[0] or "",
-                        "protein": result[1] or "",
-                        "carbs": result[2] or "",
-                        "fat": result[3] or ""
-                    }
-                return {}
+            cursor = self._reader().cursor()
+            cursor.execute(_SQL_GET_GOALS, (session_id,))
+            
+            result = cursor.fetchone()
+            goals = dict(result) if result else {}
+            self._cache_put(self._goals_cache, session_id, goals, version)
+            return goals
         except Exception as e:
             logger.error(f"Error getting goals: {e}")
             return {}
@@ -115,15 +377,11 @@ class DataManager:
     def update_goals(self, session_id: str, goals: Dict[str, str]) -> bool:
         """Update user goals for a session"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
+            with self._lock:
+                cursor = self._conn.cursor()
                 
                 # Insert or update goals
-                cursor.execute('''
-                    INSERT OR REPLACE INTO goals 
-                    (user_session, calories, protein, carbs, fat, updated_at) 
-                    VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-                ''', (
+                cursor.execute(_SQL_UPSERT_GOALS, (
                     session_id,
                     goals.get("calories", ""),
                     goals.get("protein", ""),
@@ -131,7 +389,12 @@ class DataManager:
                     goals.get("fat", "")
                 ))
                 
-                conn.commit()
+                self._bump_version(session_id)
+                # Write through with the values get_goals would read back
+                self._cache_put(self._goals_cache, session_id, {
+                    key: "" if goals.get(key) is None else str(goals[key])
+                    for key in GOAL_KEYS
+                })
                 logger.info(f"Goals updated for session {session_id}")
                 return True
         except Exception as e:
@@ -141,96 +404,104 @@ class DataManager:
     def add_food_log(self, session_id: str, food_item: str, meal_type: str = "", 
                      quantity: str = "", calories_estimated: int = 0) -> bool:
         """Add a food log entry"""
+        return self.add_food_logs(session_id, [(food_item, meal_type, quantity, calories_estimated)])
+    
+    def add_food_logs(self, session_id: str, rows: List[tuple]) -> bool:
+        """Add several food log entries in a single transaction.
+        
+        Each row is (food_item, meal_type, quantity, calories_estimated).
+        """
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT INTO food_logs 
-                    (user_session, food_item, meal_type, quantity, calories_estimated) 
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (session_id, food_item, meal_type, quantity, calories_estimated))
+            with self._lock:
+                cursor = self._conn.cursor()
+                cursor.execute("BEGIN")
+                try:
+                    cursor.executemany(_SQL_INSERT_FOOD_LOG, [(session_id, *row) for row in rows])
+                    cursor.execute("COMMIT")
+                except Exception:
+                    cursor.execute("ROLLBACK")
+                    raise
                 
-                conn.commit()
-                logger.info(f"Food log added for session {session_id}: {food_item}")
+                self._bump_version(session_id)
+                logger.info(f"{len(rows)} food log(s) added for session {session_id}: {', '.join(row[0] for row in rows)}")
                 return True
         except Exception as e:
-            logger.error(f"Error adding food log: {e}")
+            logger.error(f"Error adding food logs: {e}")
             return False
     
     def get_food_logs(self, session_id: str, limit: int = 50) -> List[Dict]:
         """Get recent food logs for a session"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    SELECT food_item, meal_type, quantity, calories_estimated, logged_at
-                    FROM food_logs 
-                    WHERE user_session = ? 
-                    ORDER BY logged_at DESC 
-                    LIMIT ?
-                ''', (session_id, limit))
-                
-                results = cursor.fetchall()
-                return [
-                    {
-                        "food_item": row[0],
-                        "meal_type": row[1],
-                        "quantity": row[2],
-                        "calories_estimated": row[3],
-                        "logged_at": row[4]
-                    }
-                    for row in results
-                ]
+            cursor = self._reader().cursor()
+            cursor.execute(_SQL_GET_FOOD_LOGS, (session_id, limit))
+            
+            return [dict(row) for row in cursor.fetchall()]
         except Exception as e:
             logger.error(f"Error getting food logs: {e}")
             return []
     
+    def get_food_logs_since(self, session_id: str, since: int, limit: int = -1) -> List[Dict]:
+        """Get food logs for a session logged at or after a unix timestamp
+        (newest first, at most limit rows; -1 means no limit)"""
+        try:
+            cursor = self._reader().cursor()
+            cursor.execute(_SQL_GET_FOOD_LOGS_SINCE, (session_id, since, limit))
+            
+            return [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"Error getting food logs since {since}: {e}")
+            return []
+    
+    def get_daily_totals(self, session_id: str, since: int) -> Dict[str, int]:
+        """Sum the calories and count the foods logged at or after a unix timestamp"""
+        try:
+            cursor = self._reader().cursor()
+            cursor.execute(_SQL_GET_FOOD_TOTALS_SINCE, (session_id, since))
+            
+            return dict(cursor.fetchone())
+        except Exception as e:
+            logger.error(f"Error getting daily totals since {since}: {e}")
+            return {"calories": 0, "foods_logged": 0}
+    
     def update_session_activity(self, session_id: str):
-        """Update last activity timestamp for a session"""
+        """Update last activity timestamp for a session in the background, at most once per interval"""
+        now = time.monotonic()
+        with self._cache_lock:
+            last = self._activity_written.get(session_id)
+            if last is not None and now - last < SESSION_ACTIVITY_INTERVAL:
+                return
+            self._activity_written[session_id] = now
+        self._background.submit(self._write_session_activity, session_id)
+    
+    def _write_session_activity(self, session_id: str):
+        """Write the last activity timestamp for a session"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT OR REPLACE INTO user_sessions 
-                    (session_id, last_activity) 
-                    VALUES (?, CURRENT_TIMESTAMP)
-                ''', (session_id,))
-                
-                conn.commit()
+            with self._lock:
+                cursor = self._conn.cursor()
+                cursor.execute(_SQL_UPSERT_SESSION, (session_id,))
         except Exception as e:
             logger.error(f"Error updating session activity: {e}")
 
     def get_user_profile(self, session_id: str) -> Dict[str, Any]:
         """Get user profile from database"""
+        cached = self._cache_get(self._profile_cache, session_id)
+        if cached is not None:
+            return cached
+        # Keyed by data version so a read started before a write is never shared after it
+        version = self.version(session_id)
+        profile = self._flights.do(("profile", session_id, version), self._read_user_profile, session_id, version)
+        return dict(profile)
+    
+    def _read_user_profile(self, session_id: str, version: int) -> Dict[str, Any]:
+        """Query a user profile and cache it"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    SELECT user_name, weight, height, age, gender, activity_level, fitness_experience, 
-                           health_conditions, dietary_preferences, food_allergies, 
-                           workout_preferences, equipment_access, updated_at
-                    FROM user_profiles 
-                    WHERE user_session = ?
-                ''', (session_id,))
-                
-                result = cursor.fetchone()
-                if result:
-                    return {
-                        "user_name": result[0],
-                        "weight": result[1],
-                        "height": result[2],
-                        "age": result[3],
-                        "gender": result[4],
-                        "activity_level": result[5],
-                        "fitness_experience": result[6],
-                        "health_conditions": result[7],
-                        "dietary_preferences": result[8],
-                        "food_allergies": result[9],
-                        "workout_preferences": result[10],
-                        "equipment_access": result[11],
-                        "updated_at": result[12]
-                    }
-                return {}
+            cursor = self._reader().cursor()
+            cursor.execute(_SQL_GET_PROFILE, (session_id,))
+            
+            result = cursor.fetchone()
+            profile = dict(result) if result else {}
+            self._cache_put(self._profile_cache, session_id, profile, version)
+            return profile
         except Exception as e:
             logger.error(f"Error getting user profile: {e}")
             return {}
@@ -238,17 +509,11 @@ class DataManager:
     def update_user_profile(self, session_id: str, profile_data: Dict[str, Any]) -> bool:
         """Update user profile in database"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
+            with self._lock:
+                cursor = self._conn.cursor()
                 
                 # Insert or update user profile
-                cursor.execute('''
-                    INSERT OR REPLACE INTO user_profiles 
-                    (user_session, user_name, weight, height, age, gender, activity_level, 
-                     fitness_experience, health_conditions, dietary_preferences, 
-                     food_allergies, workout_preferences, equipment_access, updated_at) 
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-                ''', (
+                cursor.execute(_SQL_UPSERT_PROFILE, (
                     session_id,
                     profile_data.get("user_name"),
                     profile_data.get("weight"),
@@ -264,12 +529,26 @@ class DataManager:
                     profile_data.get("equipment_access")
                 ))
                 
-                conn.commit()
+                self._bump_version(session_id)
+                # Column affinities and updated_at are applied by SQLite, so re-read on next access
+                with self._cache_lock:
+                    self._profile_cache.pop(session_id, None)
                 logger.info(f"User profile updated for session {session_id}")
                 return True
         except Exception as e:
             logger.error(f"Error updating user profile: {e}")
             return False
 
-# Create global instance
-data_manager = DataManager() 
\ No newline at end of file
+# Shared instance, created on first use so importing the tools does not open the database
+_instance: Optional[DataManager] = None
+_instance_lock = threading.Lock()
+
+def get_data_manager() -> DataManager:
+    """Get the shared DataManager, opening the database on first call"""
+    global _instance
+    if _instance is None:
+        with _instance_lock:
+            if _instance is None:
+                _instance = DataManager()
+    return _instance
+ 
\ No newline at end of file
@@ -1,9 +1,11 @@
-from typing import Dict
+from typing import Dict, List
+import orjson
 from pydantic import BaseModel, Field
-import json
+from mistralai.extra import response_format_from_pydantic_model
+from ._json import dumps, loads
 import chainlit as cl
 from .configs import mistral_model, client
-from .data_manager import data_manager
+from .data_manager import get_data_manager
 from loguru import logger
 
 FOOD_LOGGING_TOOL = {
@@ -34,6 +36,31 @@ class FoodLoggingAgent(BaseModel):
     fat: str = Field(description="Estimated fat in grams")
     meal_type: str = Field(description="Meal type (breakfast, lunch, dinner, snack)")
 
+class FoodLogEntries(BaseModel):
+    """Structured output for one or more foods mentioned in a single request"""
+    items: List[FoodLoggingAgent] = Field(description="Each distinct food item consumed")
+
+# Strict JSON schema built once at import instead of by chat.parse() on every call
+_FOOD_RESPONSE_FORMAT = response_format_from_pydantic_model(FoodLogEntries)
+
+# Reply budget: room for a few items, growing with the length of the request (~4 characters per token)
+FOOD_LOG_BASE_TOKENS = 512
+FOOD_LOG_MAX_TOKENS = 4096
+
+def _max_tokens_for(user_query: str) -> int:
+    """Token budget for the structured reply to a food logging request"""
+    return min(FOOD_LOG_MAX_TOKENS, FOOD_LOG_BASE_TOKENS + len(user_query))
+
+def _complete_items(content: str) -> List[Dict]:
+    """Items that came back whole in a reply cut off at max_tokens"""
+    end = len(content)
+    while (end := content.rfind("}", 0, end)) != -1:
+        try:
+            return loads(content[:end + 1] + "]}").get("items", [])
+        except orjson.JSONDecodeError:
+            continue
+    return []
+
 def food_logging(user_query: str) -> str:
     """
     Log food consumption provided by user with nutritional analysis.
@@ -47,9 +74,10 @@ def food_logging(user_query: str) -> str:
     try:
         # Get current session ID
         session_id = cl.user_session.get("conversation_id", "default_session")
+        data_manager = get_data_manager()
         
         # Parse food details using Mistral
-        chat_response = client.chat.parse(
+        chat_response = client.chat.complete(
             model=mistral_model,
             messages=[
                 {
@@ -57,6 +85,7 @@ def food_logging(user_query: str) -> str:
                     "content": """Analyze the food consumed by the user and provide nutritional information.
                     
                     Guidelines:
+                    - Return one item per distinct food mentioned (e.g. "eggs and toast" is two items)
                     - Extract food name, quantity, and meal type
                     - Provide realistic calorie and macronutrient estimates
                     - Use standard serving sizes if quantity is unclear
@@ -69,22 +98,31 @@ def food_logging(user_query: str) -> str:
                     "content": user_query
                 },
             ],
-            response_format=FoodLoggingAgent,
-            max_tokens=256,
+            response_format=_FOOD_RESPONSE_FORMAT,
+            max_tokens=_max_tokens_for(user_query),
             temperature=0
         )
         
         # Extract the food details from the response
-        food_details = json.loads(chat_response.choices[0].message.content)
+        choice = chat_response.choices[0]
+        truncated = choice.finish_reason == "length"
+        if truncated:
+            # Keep the items that arrived whole rather than losing the entire meal
+            food_items = _complete_items(choice.message.content)
+            logger.warning(f"Food log reply hit max_tokens; kept {len(food_items)} complete item(s)")
+        else:
+            food_items = loads(choice.message.content).get("items", [])
         
-        # Save to database
-        success = data_manager.add_food_log(
-            session_id=session_id,
-            food_item=food_details.get("food", ""),
-            meal_type=food_details.get("meal_type", ""),
-            quantity=food_details.get("quantity", ""),
-            calories_estimated=int(food_details.get("calories", "0") or "0")
-        )
+        # Save all items to database in one transaction
+        success = bool(food_items) and data_manager.add_food_logs(session_id, [
+            (
+                item.get("food", ""),
+                item.get("meal_type", ""),
+                item.get("quantity", ""),
+                int(float(item.get("calories", "0") or "0"))
+            )
+            for item in food_items
+        ])
         
         if success:
             # Update session activity
@@ -94,24 +132,26 @@ def food_logging(user_query: str) -> str:
             response = {
                 "status": "success",
                 "message": f"Food logged successfully! 🍽️",
-                "food_details": food_details
+                "food_details": food_items
             }
-            logger.info(f"Food logged for session {session_id}: {food_details.get('food', 'Unknown')}")
+            if truncated:
+                response["message"] = "Logged the foods listed below; the rest of the meal was too long to analyze at once, please log it separately. 🍽️"
+            logger.info(f"Food logged for session {session_id}: {', '.join(item.get('food', 'Unknown') for item in food_items)}")
         else:
             response = {
                 "status": "error",
                 "message": "Sorry, I couldn't save your food log. Please try again.",
-                "food_details": food_details
+                "food_details": food_items
             }
             logger.error(f"Failed to log food for session {session_id}")
         
-        return json.dumps(response, indent=2)
+        return dumps(response)
         
     except Exception as e:
         logger.error(f"Error in food_logging: {e}")
-        return json.dumps({
+        return dumps({
             "status": "error",
             "message": "An error occurred while logging your food. Please try again.",
             "error": str(e)
-        }, indent=2)
+        })
 
@@ -1,9 +1,9 @@
-import json
+from ._json import dumps
+from ._time import iso_now
 import chainlit as cl
-from .configs import mistral_model, client
-from .data_manager import data_manager
+from .llm_cache import cached_complete, state_hash, streamed_step
+from .data_manager import GOAL_KEYS, get_data_manager
 from loguru import logger
-from datetime import datetime
 
 FOOD_RECOMMENDATIONS_TOOL = {
     "type": "function",
@@ -36,6 +36,7 @@ def food_recommendations(user_query: str) -> str:
     try:
         # Get current session ID
         session_id = cl.user_session.get("conversation_id", "default_session")
+        data_manager = get_data_manager()
         
         # Get user's goals and food logs
         goals = data_manager.get_goals(session_id)
@@ -45,30 +46,14 @@ def food_recommendations(user_query: str) -> str:
         data_manager.update_session_activity(session_id)
         
         # Prepare context for recommendations
-        goals_summary = {
-            "calories": goals.get("calories", "Not set"),
-            "protein": goals.get("protein", "Not set"),
-            "carbs": goals.get("carbs", "Not set"),
-            "fat": goals.get("fat", "Not set")
-        }
-        
-        # Format recent food logs
-        recent_foods = []
-        for log in food_logs:
-            recent_foods.append({
-                "food": log.get("food_item", "Unknown"),
-                "meal_type": log.get("meal_type", "Unknown"),
-                "quantity": log.get("quantity", "Unknown"),
-                "calories": log.get("calories_estimated", 0),
-                "time": log.get("logged_at", "Unknown")
-            })
+        goals_summary = {key: goals.get(key) or "Not set" for key in GOAL_KEYS}
         
         # Create comprehensive prompt
         prompt = f"""
         You are a nutrition recommendation assistant. Provide personalized food and meal suggestions.
 
-        User's Goals: {json.dumps(goals_summary, indent=2)}
-        Recent Food Logs: {json.dumps(recent_foods, indent=2)}
+        User's Goals: {dumps(goals_summary, indent=False)}
+        Recent Food Logs: {dumps(food_logs, indent=False)}
 
         Based on their goals and what they've consumed:
         1. Suggest appropriate meals or foods that help meet nutritional targets
@@ -90,34 +75,31 @@ def food_recommendations(user_query: str) -> str:
         User Query: {user_query}
         """
         
-        # Get AI recommendations
-        response = client.chat.complete(
-            model=mistral_model,
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=500,
-            temperature=0.3
-        )
-        
-        recommendations = response.choices[0].message.content
+        # Get AI recommendations (reused while goals and logs are unchanged)
+        with streamed_step("food_recommendations") as on_token:
+            recommendations = cached_complete(
+                "food_recommendations", session_id, state_hash(goals_summary, food_logs), user_query, prompt,
+                on_token=on_token
+            )
         
         # Structure the response
         result = {
             "status": "success",
             "message": recommendations,
             "context": {
-                "goals_available": any(v != "Not set" for v in goals_summary.values()),
-                "recent_meals": len(recent_foods),
-                "generated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                "goals_available": any(goals.get(key) for key in GOAL_KEYS),
+                "recent_meals": len(food_logs),
+                "generated_at": iso_now(sep=" ")
             }
         }
         
         logger.info(f"Food recommendations generated for session {session_id}")
-        return json.dumps(result, indent=2)
+        return dumps(result)
         
     except Exception as e:
         logger.error(f"Error in food_recommendations: {e}")
-        return json.dumps({
+        return dumps({
             "status": "error",
             "message": "An error occurred while generating food recommendations. Please try again.",
             "error": str(e)
-        }, indent=2)
\ No newline at end of file
+        })
\ No newline at end of file
@@ -1,9 +1,10 @@
 from typing import Dict, List
 from pydantic import BaseModel, Field
-import json
+from mistralai.extra import response_format_from_pydantic_model
+from ._json import dumps, loads
 import chainlit as cl
 from .configs import mistral_model, client
-from .data_manager import data_manager
+from .data_manager import get_data_manager
 from loguru import logger
 
 GOAL_SETTING_TOOL = {
@@ -31,6 +32,9 @@ class GoalSettingAgent(BaseModel):
     carbs: str = Field(description="Daily carbohydrate target in grams")
     fat: str = Field(description="Daily fat target in grams")
 
+# Strict JSON schema built once at import instead of by chat.parse() on every call
+_GOALS_RESPONSE_FORMAT = response_format_from_pydantic_model(GoalSettingAgent)
+
 def goal_setting(user_query: str) -> str:
     """
     Set/update the dietary goals for the user based on their input.
@@ -44,6 +48,7 @@ def goal_setting(user_query: str) -> str:
     try:
         # Get current session ID
         session_id = cl.user_session.get("conversation_id", "default_session")
+        data_manager = get_data_manager()
         
         # Get existing goals for context
         existing_goals = data_manager.get_goals(session_id)
@@ -67,19 +72,19 @@ def goal_setting(user_query: str) -> str:
         )
         
         # Parse goals using Mistral
-        chat_response = client.chat.parse(
+        chat_response = client.chat.complete(
             model=mistral_model,
             messages=[
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_query}
             ],
-            response_format=GoalSettingAgent,
-            max_tokens=256,
+            response_format=_GOALS_RESPONSE_FORMAT,
+            max_tokens=128,
             temperature=0
         )
         
         # Extract the goals from the response
-        new_goals = json.loads(chat_response.choices[0].message.content)
+        new_goals = loads(chat_response.choices[0].message.content)
         
         # Merge with existing goals (only update non-empty values)
         updated_goals = existing_goals.copy()
@@ -109,12 +114,12 @@ def goal_setting(user_query: str) -> str:
             }
             logger.error(f"Failed to update goals for session {session_id}")
         
-        return json.dumps(response, indent=2)
+        return dumps(response)
         
     except Exception as e:
         logger.error(f"Error in goal_setting: {e}")
-        return json.dumps({
+        return dumps({
             "status": "error",
             "message": "An error occurred while setting your goals. Please try again.",
             "error": str(e)
-        }, indent=2)
\ No newline at end of file
+        })
\ No newline at end of file
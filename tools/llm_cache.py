@@ -0,0 +1,112 @@
+"""
+LLM Completion Cache for NutriSense Diet Companion
+Reuses tool-side completions while the user's goals and food logs are unchanged
+"""
+
+import asyncio
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+import chainlit as cl
+import orjson
+from loguru import logger
+
+from .configs import mistral_model, client
+from .response_cache import ResponseCache
+
+# Completions are only reused within the same data snapshot, so they can live longer
+llm_cache = ResponseCache(max_size=256, ttl_seconds=1800)
+
+# Embeds the query alongside the completion instead of after it
+_embed_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="llm-cache-embed")
+
+def state_hash(*parts) -> str:
+    """Fingerprint of the data a prompt was built from"""
+    return hashlib.blake2b(orjson.dumps(parts), digest_size=16).hexdigest()
+
+@contextmanager
+def streamed_step(name: str) -> Iterator[Callable[[str], None]]:
+    """
+    Show a tool's completion in a Chainlit step while it is generated.
+    Tools run in worker threads, so the step is driven on the session's event loop.
+    Yields the on_token callback for cached_complete().
+    """
+    loop = cl.context.loop
+    step = cl.Step(name=name, type="llm")
+
+    def run(coro):
+        asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+    run(step.send())
+    try:
+        yield lambda token: run(step.stream_token(token))
+    finally:
+        run(step.update())
+
+def _stream_completion(prompt: str, max_tokens: int, temperature: float,
+                       on_token: Callable[[str], None]) -> str:
+    """Stream a completion, forwarding each delta and returning the full text"""
+    parts = []
+    with client.chat.stream(
+        model=mistral_model,
+        messages=[{"role": "user", "content": prompt}],
+        max_tokens=max_tokens,
+        temperature=temperature
+    ) as stream:
+        for event in stream:
+            delta = event.data.choices[0].delta.content
+            if isinstance(delta, str) and delta:
+                parts.append(delta)
+                on_token(delta)
+    return "".join(parts)
+
+def cached_complete(tool_name: str, session_id: str, state: str, user_query: str, prompt: str,
+                    max_tokens: int = 500, temperature: float = 0.3,
+                    on_token: Optional[Callable[[str], None]] = None) -> str:
+    """
+    Complete a tool prompt, reusing an earlier answer to the same or a near-duplicate
+    query when it was generated from the same data snapshot.
+
+    Args:
+        tool_name: Tool issuing the completion
+        session_id: User session the data belongs to
+        state: state_hash() of the data embedded in the prompt
+        user_query: The user's request, used as the cache key
+        prompt: Full prompt sent to the model on a miss
+        on_token: Optional callback receiving the text as it streams in
+
+    Returns:
+        The completion text
+    """
+    scope = f"{tool_name}:{state}"
+
+    cached = llm_cache.get(session_id, user_query, scope=scope)
+    embedding = None
+    if cached is None and llm_cache.has_entries(session_id, scope):
+        embedding = llm_cache.embed_sync(user_query)
+        cached = llm_cache.get(session_id, user_query, embedding, scope=scope)
+    if cached is not None:
+        logger.info(f"Reused cached {tool_name} completion for session {session_id}")
+        if on_token:
+            on_token(cached[0])
+        return cached[0]
+
+    pending_embedding = None if embedding is not None else _embed_pool.submit(llm_cache.embed_sync, user_query)
+
+    if on_token:
+        content = _stream_completion(prompt, max_tokens, temperature, on_token)
+    else:
+        response = client.chat.complete(
+            model=mistral_model,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=max_tokens,
+            temperature=temperature
+        )
+        content = response.choices[0].message.content
+
+    if pending_embedding is not None:
+        embedding = pending_embedding.result()
+    llm_cache.set(session_id, user_query, [content], embedding, scope=scope)
+    return content
@@ -3,11 +3,68 @@ Memory Manager for NutriSense Diet Companion
 Uses mem0 for personalized memory and user preferences
 """
 
-import os
+import atexit
+import hashlib
+import queue
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from functools import lru_cache
+import httpx
+from cachetools import TTLCache
 from typing import Dict, List, Optional, Any
 from loguru import logger
-import json
 from datetime import datetime
+from ._env import ENV
+from ._singleflight import SingleFlight
+
+# mem0 is optional: without the package or an API key the app runs without personalization
+try:
+    from mem0 import MemoryClient
+except ImportError:
+    MemoryClient = None
+
+MEM0_API_KEY = ENV.get("MEM0_API_KEY")
+
+# Keep-alive pool for the mem0 API so profile views/updates reuse TLS connections
+MEM0_TIMEOUT = 30
+MEM0_LIMITS = httpx.Limits(max_connections=50, max_keepalive_connections=10, keepalive_expiry=60)
+MEM0_CONNECT_RETRIES = 3
+
+def _mem0_http_client() -> httpx.Client:
+    """Pooled HTTP client handed to MemoryClient (base_url/headers are set by mem0)"""
+    return httpx.Client(
+        timeout=MEM0_TIMEOUT,
+        limits=MEM0_LIMITS,
+        transport=httpx.HTTPTransport(limits=MEM0_LIMITS, retries=MEM0_CONNECT_RETRIES),
+    )
+
+@lru_cache(maxsize=None)
+def _mem0_client(api_key: str):
+    """One MemoryClient (and so one connection pool) per API key, shared by every manager"""
+    try:
+        return MemoryClient(api_key=api_key, client=_mem0_http_client())
+    except TypeError:
+        # Older mem0 releases build their own httpx client
+        return MemoryClient(api_key=api_key)
+
+# Shared pool for overlapping mem0 network calls (I/O bound, so threads overlap fine)
+_MEM0_EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix="mem0")
+# How long a caller waits for concurrent writes before answering without them
+MEM0_WRITE_TIMEOUT = 5
+
+# Background write queue: bounded so a mem0 outage cannot grow memory without limit
+MEM0_QUEUE_SIZE = 10_000
+MEM0_QUEUE_BATCH = 50
+MEM0_QUEUE_FLUSH_TIMEOUT = 10
+
+# How long an empty listing lets a user's reads skip mem0; short because other workers write too
+EMPTY_USER_TTL = 60
+# mem0 ingests adds asynchronously, so a listing this soon after a write may not show it yet
+MEM0_WRITE_GRACE = 120
+
+# Header of the context block handed to the recommendation prompts
+PERSONALIZED_CONTEXT_PREFIX = "User's personalized context:\n"
 
 class PersonalizedMemoryManager:
     """
@@ -17,25 +74,44 @@ class PersonalizedMemoryManager:
     
     def __init__(self):
         self.memory_client = None
+        # Short-lived cache of get_personalized_context results keyed by (user_id, context_type);
+        # any write for a user drops that user's entries
+        self._context_cache = TTLCache(maxsize=1024, ttl=30)
+        # mem0 search/get_all results: exact (normalized query) and token-set keys, same invalidation
+        self._search_cache = TTLCache(maxsize=2048, ttl=120)
+        # Users a recent listing found empty; their reads skip mem0 until the mark expires or
+        # something is written for them
+        self._empty_users = TTLCache(maxsize=4096, ttl=EMPTY_USER_TTL)
+        # Users with a write queued or sent recently; never marked empty inside that window
+        self._recent_writes = TTLCache(maxsize=4096, ttl=MEM0_WRITE_GRACE)
+        # Bumped by every invalidation so a listing that raced a write is not recorded as empty
+        self._generation = 0
+        self._cache_lock = threading.RLock()
+        # Concurrent misses for the same context share one mem0 search
+        self._flights = SingleFlight()
+        # Fire-and-forget writes, drained in batches by a daemon thread
+        self._write_queue: "queue.Queue[Optional[tuple]]" = queue.Queue(maxsize=MEM0_QUEUE_SIZE)
+        self._writer: Optional[threading.Thread] = None
         self._initialize_memory()
+        if self.memory_client:
+            self._writer = threading.Thread(target=self._drain_writes, name="mem0-writer", daemon=True)
+            self._writer.start()
+            atexit.register(self._flush_writes)
     
     def _initialize_memory(self):
         """Initialize mem0 memory client"""
         try:
             # Check if mem0 is available
-            try:
-                from mem0 import MemoryClient
-            except ImportError:
+            if MemoryClient is None:
                 logger.warning("mem0ai not installed - personalization features will be limited")
                 return
             
             # Initialize MemoryClient with API key from environment
-            mem0_api_key = os.getenv("MEM0_API_KEY")
-            if not mem0_api_key:
+            if not MEM0_API_KEY:
                 logger.warning("MEM0_API_KEY not found in environment variables - memory features will be limited")
                 return
-                
-            self.memory_client = MemoryClient(api_key=mem0_api_key)
+            
+            self.memory_client = _mem0_client(MEM0_API_KEY)
             logger.info("Memory client initialized successfully with mem0")
             
         except Exception as e:
@@ -43,16 +119,222 @@ class PersonalizedMemoryManager:
             logger.info("Continuing without mem0 - using fallback memory storage")
             self.memory_client = None
     
+    def _invalidate(self, user_id: str):
+        """Forget cached reads for a user after their memories change"""
+        with self._cache_lock:
+            self._generation += 1
+            self._recent_writes[user_id] = True
+            self._empty_users.pop(user_id, None)
+            for cache in (self._context_cache, self._search_cache):
+                for key in [key for key in list(cache.keys()) if key[0] == user_id]:
+                    cache.pop(key, None)
+    
+    @staticmethod
+    def _search_keys(user_id: str, query: str, limit: int) -> tuple:
+        """Exact and token-set cache keys for a memory query"""
+        normalized = " ".join(query.casefold().split())
+        tokens = " ".join(sorted(set(re.findall(r"\w+", normalized))))
+        token_hash = hashlib.blake2b(tokens.encode("utf-8"), digest_size=8).hexdigest()
+        return (user_id, "exact", normalized, limit), (user_id, "tokens", token_hash, limit)
+    
+    def _search(self, user_id: str, query: str, limit: int) -> List[Dict]:
+        """Search (or list, for an empty query) a user's memories, reusing recent results"""
+        exact_key, token_key = self._search_keys(user_id, query, limit)
+        with self._cache_lock:
+            if user_id in self._empty_users:
+                return []
+            generation = self._generation
+            cached = self._search_cache.get(exact_key)
+            if cached is None:
+                # Same words in a different order/case/punctuation
+                cached = self._search_cache.get(token_key)
+        if cached is not None:
+            return cached
+        
+        if query:
+            results = self.memory_client.search(query=query, user_id=user_id, limit=limit)
+        else:
+            results = self.memory_client.get_all(user_id=user_id, limit=limit)
+        results = results or []
+        
+        with self._cache_lock:
+            if not results and not query:
+                # Only a full listing proves the user has no memories (a search can just miss)
+                self._mark_empty(user_id, generation)
+            self._search_cache[exact_key] = results
+            self._search_cache[token_key] = results
+        if not results and query:
+            # Check in the background whether the user has any memories at all, so their next
+            # searches can skip mem0 without this one waiting on an extra round-trip
+            self.submit(self._probe_empty, user_id, generation)
+        return results
+    
+    def _mark_empty(self, user_id: str, generation: int):
+        """Record an empty listing unless a write raced it or is still being ingested (lock held)"""
+        if generation == self._generation and user_id not in self._recent_writes:
+            self._empty_users[user_id] = True
+    
+    def _probe_empty(self, user_id: str, generation: int):
+        """List one memory for a user whose search came back empty; mark them empty if they have none"""
+        with self._cache_lock:
+            if user_id in self._empty_users or user_id in self._recent_writes:
+                return
+        try:
+            empty = not self.memory_client.get_all(user_id=user_id, limit=1)
+        except Exception as e:
+            logger.error(f"Error probing memories for user {user_id}: {e}")
+            return
+        if empty:
+            with self._cache_lock:
+                self._mark_empty(user_id, generation)
+    
+    def enqueue_items(self, user_id: str, items: List[Dict]):
+        """Queue batch_add items to be written in the background (oldest are dropped when full)"""
+        if not self._writer:
+            return
+        # The user is about to have memories: stop skipping their reads now, not once the batch lands
+        self._invalidate(user_id)
+        for item in items:
+            while True:
+                try:
+                    self._write_queue.put_nowait((user_id, item))
+                    break
+                except queue.Full:
+                    try:
+                        self._write_queue.get_nowait()
+                        logger.warning("Memory write queue full - dropped the oldest pending write")
+                    except queue.Empty:
+                        pass
+    
+    def enqueue_add(self, user_id: str, content: str, metadata: Optional[Dict] = None):
+        """Queue a single memory to be written in the background"""
+        self.enqueue_items(user_id, [{"messages": [{"role": "user", "content": content}], "metadata": metadata}])
+    
+    def _drain_writes(self):
+        """Writer thread: take queued items in batches and batch_add them per user"""
+        while True:
+            entry = self._write_queue.get()
+            batch = [entry]
+            while entry is not None and len(batch) < MEM0_QUEUE_BATCH:
+                try:
+                    entry = self._write_queue.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(entry)
+            
+            by_user: Dict[str, List[Dict]] = {}
+            for queued in batch:
+                if queued is not None:
+                    by_user.setdefault(queued[0], []).append(queued[1])
+            for user_id, items in by_user.items():
+                try:
+                    self.batch_add(items, user_id)
+                except Exception as e:
+                    logger.error(f"Error writing queued memories for user {user_id}: {e}")
+            
+            if batch[-1] is None:
+                return
+    
+    def _flush_writes(self):
+        """Write whatever is still queued before the interpreter exits"""
+        if not self._writer or not self._writer.is_alive():
+            return
+        try:
+            self._write_queue.put(None, timeout=MEM0_QUEUE_FLUSH_TIMEOUT)
+        except queue.Full:
+            logger.warning("Memory write queue still full at exit - pending writes may be lost")
+            return
+        self._writer.join(timeout=MEM0_QUEUE_FLUSH_TIMEOUT)
+    
+    def submit(self, fn, *args, **kwargs) -> Future:
+        """Run a mem0 call on the shared pool"""
+        return _MEM0_EXECUTOR.submit(fn, *args, **kwargs)
+    
+    @staticmethod
+    def preference_item(preference: str, context: str = "") -> Dict:
+        """Build a batch_add item for a user preference"""
+        return {
+            "messages": [{"role": "user", "content": f"User preference: {preference}. Context: {context}"}],
+            "metadata": {"type": "preference", "context": context},
+        }
+    
+    @staticmethod
+    def workout_preference_item(workout_info: str, context: str = "") -> Dict:
+        """Build a batch_add item for a workout preference"""
+        message_content = f"Workout preference: {workout_info}"
+        if context:
+            message_content += f" Context: {context}"
+        return {
+            "messages": [{"role": "user", "content": message_content}],
+            "metadata": {"type": "workout_preference", "context": context},
+        }
+    
+    @staticmethod
+    def profile_item(profile_data: Dict) -> Dict:
+        """Build a batch_add item for a profile update"""
+        # Flat "key=value; ..." text: mem0 runs the message through an LLM, so fewer tokens is cheaper
+        summary = "; ".join(
+            f"{key}={value}" for key, value in profile_data.items()
+            if value not in (None, "") and key != "updated_at"
+        )
+        return {
+            "messages": [{"role": "user", "content": f"User profile update: {summary}"}],
+            "metadata": {"type": "profile"},
+        }
+    
+    def batch_add(self, items: List[Dict], user_id: str) -> List:
+        """
+        Add several memories for a user in one go.
+        
+        Items are {"messages": [...], "metadata": {...}} dicts. Uses the client's native
+        batch_add when it has one (a single request); older mem0 clients get the adds
+        issued concurrently on the shared pool. Waits at most MEM0_WRITE_TIMEOUT seconds;
+        adds that fail or are still running are logged and left out of the results.
+        """
+        if not self.memory_client or not items:
+            return []
+        
+        try:
+            native_batch_add = getattr(self.memory_client, "batch_add", None)
+            if native_batch_add:
+                result = native_batch_add(batch_data=items, user_id=user_id)
+                self._invalidate(user_id)
+                logger.info(f"Added {len(items)} memories for user {user_id} in one batch")
+                return result
+        except Exception as e:
+            logger.error(f"Error batch-adding memories, falling back to individual adds: {e}")
+        
+        def add_one(item: Dict):
+            try:
+                return self.memory_client.add(
+                    messages=item["messages"],
+                    user_id=user_id,
+                    metadata=item.get("metadata")
+                )
+            except Exception as e:
+                logger.error(f"Error adding memory: {e}")
+                return None
+        
+        futures = [self.submit(add_one, item) for item in items]
+        done, pending = wait(futures, timeout=MEM0_WRITE_TIMEOUT)
+        self._invalidate(user_id)
+        if pending:
+            logger.warning(f"{len(pending)} memory add(s) for user {user_id} still running after {MEM0_WRITE_TIMEOUT}s")
+        results = [future.result() for future in futures if future in done]
+        logger.info(f"Added {sum(result is not None for result in results)} memories for user {user_id}")
+        return results
+    
     def add_user_preference(self, user_id: str, preference: str, context: str = ""):
         """Add a user preference to memory"""
         try:
             if self.memory_client:
                 # Simple add operation with user_id
                 result = self.memory_client.add(
-                    messages=[{"role": "user", "content": f"User preference: {preference}. Context: {context}"}],
+                    messages=self.preference_item(preference, context)["messages"],
                     user_id=user_id
                 )
                 
+                self._invalidate(user_id)
                 logger.info(f"Added preference for user {user_id}: {preference}")
                 return result
                 
@@ -74,6 +356,7 @@ class PersonalizedMemoryManager:
                     user_id=user_id
                 )
                 
+                self._invalidate(user_id)
                 logger.info(f"Added dietary insight for user {user_id}: {insight}")
                 return result
                 
@@ -86,15 +369,12 @@ class PersonalizedMemoryManager:
         """Add workout preference to memory"""
         try:
             if self.memory_client:
-                message_content = f"Workout preference: {workout_info}"
-                if context:
-                    message_content += f" Context: {context}"
-                
                 result = self.memory_client.add(
-                    messages=[{"role": "user", "content": message_content}],
+                    messages=self.workout_preference_item(workout_info, context)["messages"],
                     user_id=user_id
                 )
                 
+                self._invalidate(user_id)
                 logger.info(f"Added workout preference for user {user_id}: {workout_info}")
                 return result
                 
@@ -107,22 +387,11 @@ class PersonalizedMemoryManager:
         """Get relevant memories for a user"""
         try:
             if self.memory_client:
-                if query:
-                    # Search with query
-                    results = self.memory_client.search(
-                        query=query,
-                        user_id=user_id,
-                        limit=limit
-                    )
-                else:
-                    # Get all memories for user
-                    results = self.memory_client.get_all(
-                        user_id=user_id,
-                        limit=limit
-                    )
+                # Search with query, or get all memories for user when there is none
+                results = self._search(user_id, query, limit)
                 
                 logger.info(f"Retrieved {len(results)} memories for user {user_id}")
-                return results if results else []
+                return results
                 
         except Exception as e:
             logger.error(f"Error retrieving user memories: {e}")
@@ -131,35 +400,44 @@ class PersonalizedMemoryManager:
     
     def get_personalized_context(self, user_id: str, context_type: str = "") -> str:
         """Get personalized context for recommendations"""
+        key = (user_id, context_type)
+        with self._cache_lock:
+            cached = self._context_cache.get(key)
+        if cached is not None:
+            return cached
+        
+        context = self._flights.do(key, self._search_personalized_context, user_id, context_type)
+        if context is None:
+            return ""
+        with self._cache_lock:
+            self._context_cache[key] = context
+        return context
+    
+    def _search_personalized_context(self, user_id: str, context_type: str) -> Optional[str]:
+        """Build personalized context from a memory search (None if the search failed)"""
         try:
             if self.memory_client:
                 # Search for relevant memories
                 query = f"preferences habits {context_type}".strip() if context_type else "preferences habits"
-                memories = self.memory_client.search(
-                    query=query,
-                    user_id=user_id,
-                    limit=5
-                )
+                memories = self._search(user_id, query, 5)
                 
-                if memories and len(memories) > 0:
-                    context_items = []
-                    for memory in memories:
-                        # Handle different memory formats
-                        if isinstance(memory, dict):
-                            memory_text = memory.get('memory', memory.get('text', str(memory)))
-                        else:
-                            memory_text = str(memory)
-                        
-                        if memory_text:
-                            context_items.append(f"- {memory_text}")
-                    
-                    if context_items:
-                        context = "User's personalized context:\n" + "\n".join(context_items)
-                        logger.info(f"Generated personalized context for user {user_id}")
-                        return context
+                if not memories:
+                    return ""
+                
+                # Handle different memory formats (dicts with memory/text, or plain values)
+                context_items = [
+                    f"- {memory.get('memory') or memory.get('text') or memory!s}" if isinstance(memory, dict)
+                    else f"- {memory}"
+                    for memory in memories if memory
+                ]
+                if context_items:
+                    context = PERSONALIZED_CONTEXT_PREFIX + "\n".join(context_items)
+                    logger.info(f"Generated personalized context for user {user_id}")
+                    return context
                     
         except Exception as e:
             logger.error(f"Error generating personalized context: {e}")
+            return None
         
         return ""
     
@@ -167,13 +445,12 @@ class PersonalizedMemoryManager:
         """Update user profile information"""
         try:
             if self.memory_client:
-                profile_message = f"User profile update: {json.dumps(profile_data, indent=2)}"
-                
                 result = self.memory_client.add(
-                    messages=[{"role": "user", "content": profile_message}],
+                    messages=self.profile_item(profile_data)["messages"],
                     user_id=user_id
                 )
                 
+                self._invalidate(user_id)
                 logger.info(f"Updated profile for user {user_id}")
                 return result
                 
@@ -3,13 +3,16 @@ User Profile Management Tool for NutriSense Diet Companion
 Manages user profiles, physical stats, preferences, and integrates with memory layer
 """
 
-import json
+import re
+from bisect import bisect_right
 import chainlit as cl
 from typing import Dict, List, Optional
 from pydantic import BaseModel, Field
-from datetime import datetime
+from functools import cached_property, lru_cache
+from ._json import dumps
+from ._time import iso_now
 from .configs import mistral_model, client
-from .data_manager import data_manager
+from .data_manager import get_data_manager
 from .memory_manager import memory_manager
 from loguru import logger
 
@@ -98,24 +101,65 @@ class ProfileData(BaseModel):
     food_allergies: Optional[str] = Field(default=None, description="Food allergies")
     workout_preferences: Optional[str] = Field(default=None, description="Workout preferences")
     equipment_access: Optional[str] = Field(default=None, description="Equipment access")
-    updated_at: str = Field(default_factory=lambda: datetime.now().isoformat())
+    updated_at: str = Field(default_factory=iso_now)
 
+    @classmethod
+    def from_row(cls, profile: Dict) -> "ProfileData":
+        """Wrap a stored profile dict without re-validating it"""
+        return cls.model_construct(**{k: v for k, v in profile.items() if v is not None})
+
+    @cached_property
+    def bmi(self) -> Optional[float]:
+        """BMI, or None until both weight and height are known"""
+        if not (self.weight and self.height):
+            return None
+        return calculate_bmi(float(self.weight), float(self.height))
+
+    @cached_property
+    def bmi_category(self) -> Optional[str]:
+        return get_bmi_category(self.bmi) if self.bmi is not None else None
+
+    @cached_property
+    def ideal_weight_range(self) -> Optional[tuple]:
+        return calculate_ideal_weight_range(float(self.height)) if self.bmi is not None else None
+
+    @property
+    def health_metrics(self) -> Dict:
+        """BMI summary for tool responses; empty when weight or height is missing"""
+        if self.bmi is None:
+            return {}
+        return {
+            "bmi": round(self.bmi, 1),
+            "bmi_category": self.bmi_category,
+            "ideal_weight_range": self.ideal_weight_range
+        }
+
+# Self-introductions; the capture is the first word after the phrase, taken as the name
+_NAME_RE = re.compile(
+    r"\b(?:i am|my name is|i['’]?m|call me|this is)\s+([A-Za-z][A-Za-z'\-]{1,30})",
+    re.IGNORECASE
+)
+
+# Memories that state who the user is ("User name: Mihir", "I am ..."); the capture runs to
+# the end of the clause, so "User name: Mihir. Context: profile" yields "Mihir"
+_IDENT_RE = re.compile(r"(?:name:|i am)\s*(?P<name>[^.,;:\n]+)", re.IGNORECASE)
+
+@lru_cache(maxsize=512)
 def calculate_bmi(weight: float, height: float) -> float:
     """Calculate BMI from weight (kg) and height (cm)"""
     height_m = height / 100  # Convert cm to meters
     return weight / (height_m ** 2)
 
+# Upper bounds (exclusive) of each BMI category; anything above the last is "Obese"
+_BMI_CATEGORY_BOUNDS = (18.5, 25, 30)
+_BMI_CATEGORIES = ("Underweight", "Normal weight", "Overweight", "Obese")
+
+@lru_cache(maxsize=512)
 def get_bmi_category(bmi: float) -> str:
     """Get BMI category"""
-    if bmi < 18.5:
-        return "Underweight"
-    elif bmi < 25:
-        return "Normal weight"
-    elif bmi < 30:
-        return "Overweight"
-    else:
-        return "Obese"
+    return _BMI_CATEGORIES[bisect_right(_BMI_CATEGORY_BOUNDS, bmi)]
 
+@lru_cache(maxsize=512)
 def calculate_ideal_weight_range(height: float) -> tuple:
     """Calculate ideal weight range based on height"""
     height_m = height / 100
@@ -177,24 +221,24 @@ def profile_management(
         elif action == "delete":
             return delete_profile(session_id)
         else:
-            return json.dumps({
+            return dumps({
                 "status": "error",
                 "message": "Invalid action. Use 'view', 'update', or 'delete'."
-            })
+            }, indent=False)
             
     except Exception as e:
         logger.error(f"Error in profile_management: {e}")
-        return json.dumps({
+        return dumps({
             "status": "error",
             "message": "An error occurred while managing your profile. Please try again.",
             "error": str(e)
-        }, indent=2)
+        }, indent=False)
 
 def get_user_profile(session_id: str) -> Dict:
     """Get user profile from database"""
     try:
         # Use the proper user profiles table
-        profile_data = data_manager.get_user_profile(session_id)
+        profile_data = get_data_manager().get_user_profile(session_id)
         return profile_data
         
     except Exception as e:
@@ -210,22 +254,10 @@ def view_profile(session_id: str, profile: Dict) -> str:
             memories = memory_manager.get_user_memories(session_id, "profile preferences", limit=5)
         
         # Calculate BMI and related metrics if data is available
-        bmi_info = {}
-        if profile.get("weight") and profile.get("height"):
-            weight = float(profile["weight"])
-            height = float(profile["height"])
-            bmi = calculate_bmi(weight, height)
-            bmi_category = get_bmi_category(bmi)
-            ideal_weight_range = calculate_ideal_weight_range(height)
-            
-            bmi_info = {
-                "bmi": round(bmi, 1),
-                "bmi_category": bmi_category,
-                "ideal_weight_range": ideal_weight_range
-            }
+        bmi_info = ProfileData.from_row(profile).health_metrics
         
         # Update session activity
-        data_manager.update_session_activity(session_id)
+        get_data_manager().update_session_activity(session_id)
         
         # Create personalized greeting message
         greeting_message = "Here's your profile! 👤"
@@ -243,15 +275,15 @@ def view_profile(session_id: str, profile: Dict) -> str:
         }
         
         logger.info(f"Profile viewed for session {session_id}")
-        return json.dumps(result, indent=2)
+        return dumps(result, indent=False)
         
     except Exception as e:
         logger.error(f"Error viewing profile: {e}")
-        return json.dumps({
+        return dumps({
             "status": "error",
             "message": "Error viewing profile.",
             "error": str(e)
-        })
+        }, indent=False)
 
 def update_profile(session_id: str, existing_profile: Dict, updates: Dict) -> str:
     """Update user profile"""
@@ -259,60 +291,50 @@ def update_profile(session_id: str, existing_profile: Dict, updates: Dict) -> st
         # Filter out None values
         updates = {k: v for k, v in updates.items() if v is not None}
         
+        # Nothing to change (e.g. the tool was called just to show the profile): skip the writes
+        if not updates:
+            return view_profile(session_id, existing_profile)
+        
         # Merge with existing profile
         updated_profile = existing_profile.copy()
         updated_profile.update(updates)
-        updated_profile["updated_at"] = datetime.now().isoformat()
+        updated_profile["updated_at"] = iso_now()
         
         # Save to database using proper user profiles table
-        success = data_manager.update_user_profile(session_id, updated_profile)
+        success = get_data_manager().update_user_profile(session_id, updated_profile)
         
         if success:
-            # Store preferences in memory for personalization
+            # Store preferences in memory for personalization (batched, written in the background)
             if memory_manager.is_available():
-                profile_summary = create_profile_summary(updated_profile)
-                memory_manager.update_user_profile(session_id, updated_profile)
+                items = [memory_manager.profile_item(updated_profile)]
                 
                 # Add user name to memory if provided
                 if updates.get("user_name"):
-                    memory_manager.add_user_preference(
-                        session_id, 
+                    items.append(memory_manager.preference_item(
                         f"User name: {updates['user_name']}", 
                         "profile"
-                    )
+                    ))
                 
                 # Add specific preferences to memory
                 if updates.get("dietary_preferences"):
-                    memory_manager.add_user_preference(
-                        session_id, 
+                    items.append(memory_manager.preference_item(
                         f"Dietary preference: {updates['dietary_preferences']}", 
                         "nutrition"
-                    )
+                    ))
                 
                 if updates.get("workout_preferences"):
-                    memory_manager.add_workout_preference(
-                        session_id, 
+                    items.append(memory_manager.workout_preference_item(
                         f"Workout preference: {updates['workout_preferences']}", 
                         "fitness"
-                    )
+                    ))
+                
+                memory_manager.enqueue_items(session_id, items)
             
             # Calculate health metrics
-            health_metrics = {}
-            if updated_profile.get("weight") and updated_profile.get("height"):
-                weight = float(updated_profile["weight"])
-                height = float(updated_profile["height"])
-                bmi = calculate_bmi(weight, height)
-                bmi_category = get_bmi_category(bmi)
-                ideal_weight_range = calculate_ideal_weight_range(height)
-                
-                health_metrics = {
-                    "bmi": round(bmi, 1),
-                    "bmi_category": bmi_category,
-                    "ideal_weight_range": ideal_weight_range
-                }
+            health_metrics = ProfileData.from_row(updated_profile).health_metrics
             
             # Update session activity
-            data_manager.update_session_activity(session_id)
+            get_data_manager().update_session_activity(session_id)
             
             # Create personalized success message
             success_message = "Profile updated successfully! ✅"
@@ -329,27 +351,27 @@ def update_profile(session_id: str, existing_profile: Dict, updates: Dict) -> st
             }
             
             logger.info(f"Profile updated for session {session_id}: {list(updates.keys())}")
-            return json.dumps(result, indent=2)
+            return dumps(result, indent=False)
         else:
-            return json.dumps({
+            return dumps({
                 "status": "error",
                 "message": "Failed to update profile. Please try again."
-            })
+            }, indent=False)
             
     except Exception as e:
         logger.error(f"Error updating profile: {e}")
-        return json.dumps({
+        return dumps({
             "status": "error",
             "message": "Error updating profile.",
             "error": str(e)
-        })
+        }, indent=False)
 
 def delete_profile(session_id: str) -> str:
     """Delete user profile"""
     try:
         # Clear profile data
-        empty_profile = {"updated_at": datetime.now().isoformat()}
-        success = data_manager.update_goals(session_id, empty_profile)
+        empty_profile = {"updated_at": iso_now()}
+        success = get_data_manager().update_goals(session_id, empty_profile)
         
         if success:
             result = {
@@ -359,36 +381,37 @@ def delete_profile(session_id: str) -> str:
             }
             
             logger.info(f"Profile deleted for session {session_id}")
-            return json.dumps(result, indent=2)
+            return dumps(result, indent=False)
         else:
-            return json.dumps({
+            return dumps({
                 "status": "error",
                 "message": "Failed to delete profile. Please try again."
-            })
+            }, indent=False)
             
     except Exception as e:
         logger.error(f"Error deleting profile: {e}")
-        return json.dumps({
+        return dumps({
             "status": "error",
             "message": "Error deleting profile.",
             "error": str(e)
-        })
+        }, indent=False)
+
+# Fields counted towards profile completeness
+_REQUIRED_FIELDS = (
+    "user_name", "weight", "height", "age", "gender", "activity_level",
+    "fitness_experience", "dietary_preferences"
+)
 
 def calculate_profile_completeness(profile: Dict) -> Dict:
     """Calculate profile completeness percentage"""
-    required_fields = [
-        "user_name", "weight", "height", "age", "gender", "activity_level", 
-        "fitness_experience", "dietary_preferences"
-    ]
-    
-    completed_fields = sum(1 for field in required_fields if profile.get(field))
-    completeness_percentage = (completed_fields / len(required_fields)) * 100
+    missing_fields = [field for field in _REQUIRED_FIELDS if not profile.get(field)]
+    completed_fields = len(_REQUIRED_FIELDS) - len(missing_fields)
     
     return {
-        "percentage": round(completeness_percentage, 1),
+        "percentage": round(completed_fields * 100 / len(_REQUIRED_FIELDS), 1),
         "completed_fields": completed_fields,
-        "total_fields": len(required_fields),
-        "missing_fields": [field for field in required_fields if not profile.get(field)]
+        "total_fields": len(_REQUIRED_FIELDS),
+        "missing_fields": missing_fields
     }
 
 def create_profile_summary(profile: Dict) -> str:
@@ -401,8 +424,8 @@ def create_profile_summary(profile: Dict) -> str:
     if profile.get("age"):
         summary_parts.append(f"Age: {profile['age']} years")
     
-    if profile.get("weight") and profile.get("height"):
-        bmi = calculate_bmi(float(profile["weight"]), float(profile["height"]))
+    bmi = ProfileData.from_row(profile).bmi
+    if bmi is not None:
         summary_parts.append(f"BMI: {bmi:.1f}")
     
     if profile.get("activity_level"):
@@ -430,8 +453,9 @@ def get_user_identity(session_id: str) -> str:
             for memory in memories:
                 if isinstance(memory, dict):
                     memory_text = memory.get('memory', memory.get('text', ''))
-                    if 'name:' in memory_text.lower() or 'i am' in memory_text.lower():
-                        return memory_text.split(':')[-1].strip() if ':' in memory_text else "User"
+                    match = _IDENT_RE.search(memory_text)
+                    if match and match["name"].strip():
+                        return match["name"].strip()
         
         return "User"
     except Exception as e:
@@ -441,34 +465,23 @@ def get_user_identity(session_id: str) -> str:
 def auto_store_user_name(session_id: str, user_message: str) -> bool:
     """Automatically detect and store user name from messages like 'I am Mihir'"""
     try:
-        # Simple pattern matching for self-introduction
-        message_lower = user_message.lower().strip()
-        
-        # Check for patterns like "I am [name]", "My name is [name]", "I'm [name]"
-        patterns = [
-            "i am ", "my name is ", "i'm ", "im ", "call me ", "this is "
-        ]
+        # One pass over the message for "I am [name]", "My name is [name]", "I'm [name]", ...
+        match = _NAME_RE.search(user_message)
+        if not match:
+            return False
         
-        for pattern in patterns:
-            if pattern in message_lower:
-                # Extract the name part
-                name_part = message_lower.split(pattern)[1].strip()
-                # Take only the first word as the name (to avoid getting full sentences)
-                name = name_part.split()[0] if name_part.split() else ""
-                
-                # Clean up the name (remove punctuation, capitalize)
-                name = name.strip('.,!?').capitalize()
-                
-                if name and len(name) > 1:  # Valid name
-                    # Store in profile
-                    profile_management(
-                        user_query=f"Store user name: {name}",
-                        action="update",
-                        user_name=name
-                    )
-                    return True
+        # Clean up the name (remove stray punctuation, capitalize)
+        name = match.group(1).strip("'-").capitalize()
+        if len(name) < 2:  # Not a valid name
+            return False
         
-        return False
+        # Store in profile
+        profile_management(
+            user_query=f"Store user name: {name}",
+            action="update",
+            user_name=name
+        )
+        return True
     except Exception as e:
         logger.error(f"Error auto-storing user name: {e}")
-        return False 
\ No newline at end of file
+        return False
@@ -0,0 +1,38 @@
+"""
+Quick Replies for NutriSense Diet Companion
+Answers structurally trivial messages locally instead of calling the model
+"""
+
+import re
+from typing import Optional, Tuple
+
+# Whole-message patterns only, so "hi, I had eggs for breakfast" still reaches the agents
+TRIVIAL_PATTERNS = (
+    ("greeting", re.compile(r"^\s*(hi|hello|hey|hiya|howdy|good (morning|afternoon|evening))(\s+there)?[\s!.]*$", re.I)),
+    ("thanks", re.compile(r"^\s*(thanks|thank you|thanks a lot|thank you so much|thx|ty)[\s!.]*$", re.I)),
+    ("goodbye", re.compile(r"^\s*(bye|goodbye|bye bye|see you|see ya|good night)[\s!.]*$", re.I)),
+    # Only messages made up entirely of swearing; a curse inside a real request still goes through
+    ("profanity", re.compile(r"^\s*((fuck|fucking|shit|damn|crap|wtf|bullshit|screw)(\s+(this|that|it|you))?[\s!.?,*]*)+$", re.I)),
+)
+
+CANNED_REPLIES = {
+    "empty": "I didn't catch that. Tell me what you ate, ask about your progress, or set a goal to get started!",
+    "greeting": "Hi there! 👋 How can I help with your nutrition or fitness today?",
+    "thanks": "You're welcome! 😊 Let me know if there's anything else I can help with.",
+    "goodbye": "Goodbye! 👋 Keep up the great work with your health goals!",
+    "profanity": "Sounds frustrating! 😅 Tell me what's going on with your meals, goals or workouts and I'll help sort it out.",
+}
+
+# Messages with no letters or digits at all (blank, emoji-only, punctuation-only)
+_NO_WORDS = re.compile(r"^[\W_]*$")
+
+def classify_trivial(text: str) -> Optional[Tuple[str, str]]:
+    """Return (kind, canned_reply) for trivial messages, or None if the model is needed"""
+    if not text or _NO_WORDS.match(text):
+        return "empty", CANNED_REPLIES["empty"]
+
+    for kind, pattern in TRIVIAL_PATTERNS:
+        if pattern.match(text):
+            return kind, CANNED_REPLIES[kind]
+
+    return None
@@ -0,0 +1,120 @@
+"""
+Response Cache for NutriSense Diet Companion
+Short-lived semantic cache of assistant responses for repeated user queries
+"""
+
+import hashlib
+import re
+from typing import Dict, List, Optional
+
+import numpy as np
+from cachetools import TTLCache
+from loguru import logger
+
+from .configs import client
+
+EMBEDDING_MODEL = "mistral-embed"
+
+class ResponseCache:
+    """
+    LRU + TTL cache of responses keyed by user, prompt and an optional scope.
+    Falls back to embedding similarity when there is no exact match.
+    """
+
+    def __init__(self, max_size: int = 512, ttl_seconds: int = 600, similarity_threshold: float = 0.92):
+        self.cache = TTLCache(maxsize=max_size, ttl=ttl_seconds)
+        self.similarity_threshold = similarity_threshold
+
+    @staticmethod
+    def _normalize(prompt: str) -> str:
+        """Normalize a prompt so trivial variations share a cache key"""
+        return re.sub(r"\s+", " ", prompt.casefold()).strip(" .!?")
+
+    def _key(self, user_id: str, prompt: str, scope: str = "") -> str:
+        """Exact-match cache key for a user's prompt"""
+        return hashlib.sha256(f"{user_id}\x00{scope}\x00{self._normalize(prompt)}".encode("utf-8")).hexdigest()
+
+    def has_entries(self, user_id: str, scope: str = "") -> bool:
+        """Check whether anything is cached for a user (within a scope)"""
+        return any(
+            entry["user_id"] == user_id and entry["scope"] == scope
+            for entry in list(self.cache.values())
+        )
+
+    @staticmethod
+    def _unit_vector(response) -> Optional[np.ndarray]:
+        vector = np.asarray(response.data[0].embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    async def embed(self, prompt: str) -> Optional[np.ndarray]:
+        """Embed a prompt as a unit-length float32 vector"""
+        try:
+            response = await client.embeddings.create_async(
+                model=EMBEDDING_MODEL,
+                inputs=[self._normalize(prompt)]
+            )
+            return self._unit_vector(response)
+        except Exception as e:
+            logger.warning(f"Could not embed prompt for response cache: {e}")
+            return None
+
+    def embed_sync(self, prompt: str) -> Optional[np.ndarray]:
+        """Blocking variant of embed() for tools running in worker threads"""
+        try:
+            response = client.embeddings.create(
+                model=EMBEDDING_MODEL,
+                inputs=[self._normalize(prompt)]
+            )
+            return self._unit_vector(response)
+        except Exception as e:
+            logger.warning(f"Could not embed prompt for response cache: {e}")
+            return None
+
+    def get(self, user_id: str, prompt: str, embedding: Optional[np.ndarray] = None,
+            scope: str = "") -> Optional[List[str]]:
+        """Get cached response tokens for an identical or near-duplicate prompt"""
+        entry = self.cache.get(self._key(user_id, prompt, scope))
+        if entry:
+            logger.info(f"Response cache hit (exact) for user {user_id}")
+            return entry["tokens"]
+
+        if embedding is None:
+            return None
+
+        candidates = [
+            entry for entry in list(self.cache.values())
+            if entry["user_id"] == user_id and entry["scope"] == scope and entry["embedding"] is not None
+        ]
+        if not candidates:
+            return None
+
+        # Cosine similarity against all cached prompts in one vectorized dot product
+        similarities = np.stack([entry["embedding"] for entry in candidates]) @ embedding
+        best = int(np.argmax(similarities))
+        if similarities[best] > self.similarity_threshold:
+            logger.info(f"Response cache hit (semantic, {similarities[best]:.3f}) for user {user_id}")
+            return candidates[best]["tokens"]
+
+        return None
+
+    def set(self, user_id: str, prompt: str, tokens: List[str], embedding: Optional[np.ndarray] = None,
+            scope: str = ""):
+        """Cache the response tokens for a prompt"""
+        self.cache[self._key(user_id, prompt, scope)] = {
+            "user_id": user_id,
+            "scope": scope,
+            "embedding": embedding,
+            "tokens": tokens,
+        }
+
+    def invalidate(self, user_id: str):
+        """Drop all cached responses for a user (e.g. after their data changes)"""
+        stale_keys = [key for key, entry in list(self.cache.items()) if entry["user_id"] == user_id]
+        for key in stale_keys:
+            self.cache.pop(key, None)
+        if stale_keys:
+            logger.info(f"Invalidated {len(stale_keys)} cached responses for user {user_id}")
+
+# Create global instance
+response_cache = ResponseCache()
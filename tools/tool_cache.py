@@ -0,0 +1,66 @@
+"""
+Tool Result Cache for NutriSense Diet Companion
+Reuses results of read-only tools while the user's stored data is unchanged
+"""
+
+import hashlib
+import orjson
+from typing import Dict, Optional
+
+from cachetools import TTLCache
+from loguru import logger
+
+from .data_manager import get_data_manager
+
+def _is_read_only_profile_call(arguments: Dict) -> bool:
+    return arguments.get("action") == "view"
+
+# Tool name -> predicate deciding whether a call with these arguments is cacheable
+CACHEABLE_TOOLS = {
+    "daily_progress": lambda arguments: True,
+    "food_recommendations": lambda arguments: True,
+    "profile_management": _is_read_only_profile_call,
+}
+
+def is_error_result(result: str) -> bool:
+    """Check whether a tool's JSON result reports a failure"""
+    try:
+        return orjson.loads(result).get("status") == "error"
+    except (orjson.JSONDecodeError, AttributeError):
+        return False
+
+class ToolResultCache:
+    """
+    TTL cache of tool results keyed by tool, user, arguments and the user's data version.
+    Any write through the data manager bumps the version, so stale entries are never hit.
+    """
+
+    def __init__(self, max_size: int = 256, ttl_seconds: int = 30):
+        self.cache = TTLCache(maxsize=max_size, ttl=ttl_seconds)
+
+    def _key(self, function_name: str, user_id: str, arguments: Dict) -> Optional[tuple]:
+        """Cache key for a call, or None if the call is not cacheable"""
+        is_cacheable = CACHEABLE_TOOLS.get(function_name)
+        if not is_cacheable or not is_cacheable(arguments):
+            return None
+        args_hash = hashlib.sha256(orjson.dumps(arguments, option=orjson.OPT_SORT_KEYS)).hexdigest()
+        return (function_name, user_id, args_hash, get_data_manager().version(user_id))
+
+    def get(self, function_name: str, user_id: str, arguments: Dict) -> Optional[str]:
+        """Get a cached tool result"""
+        key = self._key(function_name, user_id, arguments)
+        if key is None:
+            return None
+        result = self.cache.get(key)
+        if result is not None:
+            logger.info(f"Tool cache hit for {function_name} (user {user_id})")
+        return result
+
+    def set(self, function_name: str, user_id: str, arguments: Dict, result: str):
+        """Cache a successful tool result if the call is cacheable"""
+        key = self._key(function_name, user_id, arguments)
+        if key is not None and not is_error_result(result):
+            self.cache[key] = result
+
+# Create global instance
+tool_cache = ToolResultCache()
@@ -1,100 +1,265 @@
-import os
+import json
+import random
+import re
+import threading
 import time
-import hashlib
-from typing import Dict, List, Optional
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Hashable, List, Optional
 from pydantic import BaseModel, Field
-import json
 import exa_py
+import requests
+from requests.adapters import HTTPAdapter
 from loguru import logger
-from datetime import datetime, timedelta
+from ._env import ENV
+from ._json import dumps
+from ._time import iso_now
+
+# Per-query freshness: time-sensitive searches expire in minutes, reference-style ones last days
+VOLATILE_QUERY_TTL = 15 * 60
+STABLE_QUERY_TTL = 7 * 24 * 3600
+_VOLATILE_TERMS = ("news", "today", "latest", "trend", "current", "this week", "this year", "recent")
+_STABLE_TERMS = ("recipe", "definition", "what is", "how to", "benefits of", "calories in", "nutrition facts")
+
+# Negative caching: failed searches and searches with no results are kept briefly
+FAILED_SEARCH_TTL = 60
+EMPTY_RESULT_TTL = 5 * 60
+
+# How often the janitor sweeps expired entries; entries live from a minute to days, so a
+# fixed few-minute sweep keeps short-lived ones from lingering
+CACHE_CLEANUP_INTERVAL = 5 * 60
+
+# Above this fill ratio new entries get proportionally shorter TTLs (down to a quarter when full)
+CACHE_PRESSURE_THRESHOLD = 0.7
+CACHE_PRESSURE_MIN_FACTOR = 0.25
 
-# Simple in-memory cache for search results
+def query_ttl(query: str) -> Optional[float]:
+    """TTL in seconds for a search query, or None for the cache default"""
+    text = query.casefold()
+    if any(term in text for term in _VOLATILE_TERMS):
+        return VOLATILE_QUERY_TTL
+    if any(term in text for term in _STABLE_TERMS):
+        return STABLE_QUERY_TTL
+    return None
+
+# Simple in-memory LRU cache for search results
 class SearchCache:
-    def __init__(self, max_size: int = 100, ttl_hours: int = 24):
-        self.cache = {}
+    def __init__(self, max_size: int = 100, ttl_hours: int = 24, max_bytes: int = 2 * 1024 * 1024):
+        # Least recently used first, so eviction is popitem(last=False).
+        # Entries are (result, timestamp, ttl, size).
+        self.cache: "OrderedDict[Hashable, tuple]" = OrderedDict()
         self.max_size = max_size
+        # Results vary from a few hundred bytes to tens of KB, so total size is capped too
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
         self.ttl_hours = ttl_hours
-        self.last_cleanup = datetime.now()
+        # Ages are compared as time.monotonic() seconds (cheap, immune to clock changes)
+        self.ttl_seconds = ttl_hours * 3600
+        # Expired entries are swept by a daemon thread; get/set only check the entry they touch
+        self.cleanup_interval = min(CACHE_CLEANUP_INTERVAL, self.ttl_seconds)
+        self._lock = threading.Lock()
+        threading.Thread(target=self._janitor, name="search-cache-janitor", daemon=True).start()
+    
+    def _janitor(self):
+        """Periodically drop expired entries"""
+        while True:
+            time.sleep(self.cleanup_interval)
+            try:
+                self._cleanup_expired()
+            except Exception as e:
+                logger.error(f"Error cleaning up search cache: {e}")
+    
+    def _remove(self, key: Hashable):
+        """Drop an entry and its size from the totals (caller holds the lock)"""
+        self.total_bytes -= self.cache.pop(key)[3]
     
     def _cleanup_expired(self):
         """Remove expired entries from cache"""
-        if datetime.now() - self.last_cleanup < timedelta(hours=1):
-            return
-        
-        current_time = datetime.now()
-        expired_keys = [
-            key for key, (_, timestamp) in self.cache.items()
-            if current_time - timestamp > timedelta(hours=self.ttl_hours)
-        ]
-        
-        for key in expired_keys:
-            del self.cache[key]
-        
-        self.last_cleanup = current_time
+        current_time = time.monotonic()
+        with self._lock:
+            expired_keys = [
+                key for key, (_, timestamp, ttl, _) in self.cache.items()
+                if current_time - timestamp > ttl
+            ]
+            
+            for key in expired_keys:
+                self._remove(key)
     
-    def get(self, query: str) -> Optional[str]:
-        """Get cached result for a query"""
-        self._cleanup_expired()
-        query_hash = hashlib.md5(query.lower().encode()).hexdigest()
-        
-        if query_hash in self.cache:
-            result, timestamp = self.cache[query_hash]
-            if datetime.now() - timestamp < timedelta(hours=self.ttl_hours):
-                logger.info(f"Cache hit for query: {query}")
-                return result
-            else:
-                del self.cache[query_hash]
+    def get(self, key: Hashable) -> Optional[str]:
+        """Get cached result for a query key (any hashable, e.g. a tuple of search arguments)"""
+        with self._lock:
+            entry = self.cache.get(key)
+            if entry is None:
+                return None
+            result, timestamp, ttl, _ = entry
+            if time.monotonic() - timestamp >= ttl:
+                self._remove(key)
+                return None
+            self.cache.move_to_end(key)
         
-        return None
+        logger.info(f"Cache hit for query: {key}")
+        return result
     
-    def set(self, query: str, result: str):
-        """Cache a search result"""
-        self._cleanup_expired()
-        query_hash = hashlib.md5(query.lower().encode()).hexdigest()
-        
-        # Remove oldest entries if cache is full
-        if len(self.cache) >= self.max_size:
-            oldest_key = min(self.cache.keys(), key=lambda k: self.cache[k][1])
-            del self.cache[oldest_key]
+    def set(self, key: Hashable, result: str, ttl: Optional[float] = None):
+        """Cache a search result for ttl seconds (default: the cache-wide TTL)"""
+        if ttl is None:
+            ttl = self.ttl_seconds
+        with self._lock:
+            # Shorten lifetimes as the cache fills so churn makes room sooner
+            fill = len(self.cache) / self.max_size
+            if fill > CACHE_PRESSURE_THRESHOLD:
+                pressure = (fill - CACHE_PRESSURE_THRESHOLD) / (1 - CACHE_PRESSURE_THRESHOLD)
+                ttl *= max(CACHE_PRESSURE_MIN_FACTOR, 1 - pressure)
+            
+            if key in self.cache:
+                self._remove(key)
+            self.cache[key] = (result, time.monotonic(), ttl, len(result))
+            self.total_bytes += len(result)
+            
+            # Remove the least recently used entries if cache is full (by count or by size)
+            while len(self.cache) > self.max_size or (self.total_bytes > self.max_bytes and len(self.cache) > 1):
+                self._remove(next(iter(self.cache)))
+        logger.info(f"Cached result for query: {key}")
+    
+    def invalidate(self, pattern: str) -> int:
+        """Drop entries whose query contains pattern (case-insensitive); returns how many"""
+        pattern = pattern.casefold()
+        with self._lock:
+            # Tuple keys carry the query first, e.g. (query, num_results, include_content)
+            stale_keys = [
+                key for key in self.cache
+                if pattern in str(key[0] if isinstance(key, tuple) else key).casefold()
+            ]
+            for key in stale_keys:
+                self._remove(key)
         
-        self.cache[query_hash] = (result, datetime.now())
-        logger.info(f"Cached result for query: {query}")
+        if stale_keys:
+            logger.info(f"Invalidated {len(stale_keys)} cached searches matching: {pattern}")
+        return len(stale_keys)
 
 # Global cache instance
 search_cache = SearchCache()
 
-# Rate limiting
+def invalidate_search_cache(pattern: str) -> int:
+    """Evict cached web searches whose query contains pattern (e.g. "news")"""
+    return search_cache.invalidate(pattern)
+
+# Rate limiting: sliding window estimated from the current and previous fixed windows,
+# so state is two counters regardless of max_requests
 class RateLimiter:
     def __init__(self, max_requests: int = 20, window_minutes: int = 60):
         self.max_requests = max_requests
         self.window_minutes = window_minutes
-        self.requests = []
+        self.window_seconds = window_minutes * 60
+        self.prev_count = 0
+        self.curr_count = 0
+        self.window_start = time.monotonic()
+        # Tools run concurrently in worker threads; the counters are read-modify-write
+        self._lock = threading.Lock()
+    
+    def _advance(self) -> float:
+        """Move to the fixed window containing now; returns how far into it we are (0..1)"""
+        elapsed = time.monotonic() - self.window_start
+        if elapsed >= self.window_seconds:
+            windows = int(elapsed // self.window_seconds)
+            # The previous window only counts if it is the one right before this
+            self.prev_count = self.curr_count if windows == 1 else 0
+            self.curr_count = 0
+            self.window_start += windows * self.window_seconds
+            elapsed -= windows * self.window_seconds
+        return elapsed / self.window_seconds
+    
+    def _estimate(self) -> float:
+        """Requests in the sliding window ending now (caller holds the lock)"""
+        progress = self._advance()
+        # Assume the previous window's requests were spread evenly across it
+        return self.curr_count + self.prev_count * (1 - progress)
     
     def can_make_request(self) -> bool:
         """Check if we can make a request without exceeding rate limit"""
-        current_time = datetime.now()
-        # Remove requests outside the window
-        self.requests = [
-            req_time for req_time in self.requests
-            if current_time - req_time < timedelta(minutes=self.window_minutes)
-        ]
-        
-        return len(self.requests) < self.max_requests
+        with self._lock:
+            return self._estimate() < self.max_requests
     
     def record_request(self):
         """Record a new request"""
-        self.requests.append(datetime.now())
+        with self._lock:
+            self._advance()
+            self.curr_count += 1
+    
+    def is_allowed(self) -> bool:
+        """Check the limit and record the request in one step, so concurrent callers cannot overshoot it"""
+        with self._lock:
+            if self._estimate() >= self.max_requests:
+                return False
+            self.curr_count += 1
+            return True
 
 # Global rate limiter
 rate_limiter = RateLimiter()
 
+EXA_API_KEY = ENV.get("EXA_API_KEY")
+
+# Longest single wait between search retries, in seconds
+EXA_MAX_BACKOFF = 10
+
+# exa_py reports HTTP failures as ValueError("Request failed with status code NNN: ...")
+_STATUS_CODE_RE = re.compile(r"status code (\d{3})")
+
+def is_retryable(error: Exception) -> bool:
+    """Whether a failed search may succeed on retry (network errors, 5xx, 408, 429)"""
+    match = _STATUS_CODE_RE.search(str(error))
+    if not match:
+        return True
+    status = int(match.group(1))
+    return status >= 500 or status in (408, 429)
+
+# Keep-alive pool for api.exa.ai. The sync Exa client calls requests.get/post directly,
+# and each of those opens (and tears down) its own session, so every search paid a fresh
+# TCP + TLS handshake. Retries happen in exa_web_search, so the adapter makes none.
+EXA_POOL_SIZE = 10
+
+class PooledExa(exa_py.Exa):
+    """
+    Exa client whose plain JSON calls go through one keep-alive session.
+    Overrides Exa.request, the client's single HTTP entry point; streaming responses
+    and other HTTP methods are left to the stock implementation.
+    """
+    
+    def __init__(self, api_key: str):
+        super().__init__(api_key)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=EXA_POOL_SIZE, pool_maxsize=EXA_POOL_SIZE, max_retries=0)
+        self.session.mount("https://", adapter)
+    
+    def request(self, endpoint: str, data=None, method: str = "POST", params=None, headers=None, **kwargs):
+        request_headers = {**self.headers, **(headers or {})}
+        streaming = (
+            (isinstance(data, dict) and data.get("stream"))
+            or (params or {}).get("stream") == "true"
+            or request_headers.get("Accept") == "text/event-stream"
+        )
+        if kwargs or streaming or method.upper() not in ("GET", "POST"):
+            # Older exa_py releases take no headers argument, so only pass it on when set
+            if headers:
+                kwargs["headers"] = headers
+            return super().request(endpoint, data, method, params, **kwargs)
+        
+        body = data if isinstance(data, str) else (json.dumps(data, default=str) if data else None)
+        res = self.session.request(
+            method.upper(), self.base_url + endpoint, data=body, params=params, headers=request_headers
+        )
+        if res.status_code >= 400:
+            # Same message as exa_py, which is_retryable reads the status code from
+            raise ValueError(f"Request failed with status code {res.status_code}: {res.text}")
+        return res.json()
+
+@lru_cache(maxsize=1)
 def get_exa_client():
-    """Get Exa client with API key from environment"""
-    exa_api_key = os.getenv("EXA_API_KEY")
-    if not exa_api_key:
+    """Get the shared Exa client, built on first use (get_exa_client.cache_clear() rebuilds it)"""
+    if not EXA_API_KEY:
         logger.error("EXA_API_KEY not found in environment variables")
         return None
-    return exa_py.Exa(exa_api_key)
+    return PooledExa(EXA_API_KEY)
 
 WEB_SEARCH_TOOL = {
     "type": "function",
@@ -143,41 +308,39 @@ def exa_web_search(query: str, num_results: int = 5, include_content: bool = Tru
     Returns:
         JSON string containing search results
     """
+    cache_key = None
     try:
         # Validate inputs
         if not query or not query.strip():
-            return json.dumps({
+            return dumps({
                 "error": "Search query cannot be empty"
-            })
+            }, indent=False)
         
         query = query.strip()
         num_results = min(max(num_results, 1), 10)  # Clamp between 1 and 10
         
-        # Check cache first
-        cache_key = f"{query}_{num_results}_{include_content}"
+        # Check cache first (the tuple is hashed natively by the dict lookup)
+        cache_key = (query.lower(), num_results, include_content)
         cached_result = search_cache.get(cache_key)
         if cached_result:
             return cached_result
         
-        # Check rate limit
-        if not rate_limiter.can_make_request():
-            return json.dumps({
-                "error": "Rate limit exceeded. Please try again later.",
-                "query": query,
-                "cached": False
-            })
-        
         # Get Exa client
         exa = get_exa_client()
         if not exa:
-            return json.dumps({
+            return dumps({
                 "error": "Exa API key not configured. Please add EXA_API_KEY to your environment variables."
-            })
+            }, indent=False)
         
-        logger.info(f"Performing web search with query: {query}")
+        # Check the rate limit and record this request
+        if not rate_limiter.is_allowed():
+            return dumps({
+                "error": "Rate limit exceeded. Please try again later.",
+                "query": query,
+                "cached": False
+            }, indent=False)
         
-        # Record the request for rate limiting
-        rate_limiter.record_request()
+        logger.info(f"Performing web search with query: {query}")
         
         # Perform search with timeout and retry logic
         max_retries = 3
@@ -197,24 +360,25 @@ def exa_web_search(query: str, num_results: int = 5, include_content: bool = Tru
                     )
                 break
             except Exception as e:
-                if attempt < max_retries - 1:
+                if attempt < max_retries - 1 and is_retryable(e):
                     logger.warning(f"Search attempt {attempt + 1} failed: {e}. Retrying...")
-                    time.sleep(2 ** attempt)  # Exponential backoff
+                    # Exponential backoff with full jitter so concurrent callers don't retry in lockstep
+                    time.sleep(min(EXA_MAX_BACKOFF, random.uniform(0, 2 ** attempt)))
                 else:
                     raise e
         
         # Process results
         results = []
         for result in search_response.results:
-            content = ""
-            if hasattr(result, 'text') and result.text:
-                # Limit content length to avoid overwhelming responses
-                content = result.text[:800] + "..." if len(result.text) > 800 else result.text
+            # Limit content and title length to avoid overwhelming responses
+            text = getattr(result, 'text', None) or ""
+            content = f"{text[:800]}..." if len(text) > 800 else (text or "No content available")
+            title = result.title
             
             search_result = {
-                "title": result.title[:200] if result.title else "No title",  # Limit title length
+                "title": title[:200] if title else "No title",
                 "url": result.url,
-                "content": content if content else "No content available",
+                "content": content,
                 "published_date": getattr(result, 'published_date', 'Not available')
             }
             results.append(search_result)
@@ -225,27 +389,31 @@ def exa_web_search(query: str, num_results: int = 5, include_content: bool = Tru
             "query": query,
             "num_results": len(results),
             "results": results,
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": iso_now(),
             "cached": False
         }
         
-        result_json = json.dumps(response_data, indent=2)
+        result_json = dumps(response_data, indent=False)
         
-        # Cache the result
-        search_cache.set(cache_key, result_json)
+        # Cache the result (briefly when nothing was found, so a retry can pick up new pages)
+        search_cache.set(cache_key, result_json, query_ttl(query) if results else EMPTY_RESULT_TTL)
         
         logger.info(f"Web search completed successfully. Found {len(results)} results.")
         return result_json
         
     except Exception as e:
         logger.error(f"Error during web search: {str(e)}")
-        return json.dumps({
+        error_json = dumps({
             "status": "error",
             "error": f"Web search failed: {str(e)}",
             "query": query,
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": iso_now(),
             "cached": False
-        })
+        }, indent=False)
+        # Negative cache: repeats of a failing search don't hit Exa again for a minute
+        if cache_key is not None:
+            search_cache.set(cache_key, error_json, FAILED_SEARCH_TTL)
+        return error_json
 
 # Export the tool and function for use in other modules
-__all__ = ["WEB_SEARCH_TOOL", "exa_web_search"] 
\ No newline at end of file
+__all__ = ["WEB_SEARCH_TOOL", "exa_web_search", "invalidate_search_cache"] 
\ No newline at end of file
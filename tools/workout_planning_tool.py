@@ -3,14 +3,15 @@ Workout Planning Tool for NutriSense Diet Companion
 Creates personalized workout plans based on BMI, weight, diet goals, and user preferences
 """
 
-import json
 import chainlit as cl
+from functools import lru_cache
 from typing import Dict, List, Optional
 from pydantic import BaseModel, Field
-import numpy as np
-from datetime import datetime
+from mistralai.extra import response_format_from_pydantic_model
+from ._json import dumps, loads
+from ._time import iso_now
 from .configs import mistral_model, client
-from .data_manager import data_manager
+from .data_manager import get_data_manager
 from .memory_manager import memory_manager
 from loguru import logger
 
@@ -68,6 +69,68 @@ class WorkoutPlanningAgent(BaseModel):
     progression_tips: str = Field(description="Tips for progression and tracking")
     safety_notes: str = Field(description="Safety considerations and precautions")
 
+# Strict JSON schema built once at import instead of by chat.parse() on every call
+_WORKOUT_RESPONSE_FORMAT = response_format_from_pydantic_model(WorkoutPlanningAgent)
+
+_SYSTEM_PROMPT = """You are an expert fitness trainer and nutritionist. 
+Create comprehensive, personalized workout plans that are safe, effective, and aligned with the user's goals.
+Consider their BMI, dietary goals, and personal preferences.
+Provide practical, actionable advice."""
+
+# Per-user part of the context, filled with str.format on every request
+_CONTEXT_TEMPLATE = """
+Create a personalized workout plan for the user.
+
+User Query: {user_query}
+
+Physical Stats:
+- Weight: {weight} kg
+- Height: {height} cm
+- Age: {age} years
+- {bmi_info}
+- {calorie_info}
+
+Current Nutrition Goals:
+- Calories: {calories}
+- Protein: {protein}g
+- Carbs: {carbs}g
+- Fat: {fat}g
+
+Recent Food Intake:
+{recent_foods}
+
+{personalized_context}
+"""
+
+# Plan request, which depends only on the few enum-like workout parameters
+_PLAN_REQUEST_TEMPLATE = """
+Fitness Parameters:
+- Fitness Level: {fitness_level}
+- Primary Goal: {workout_goal}
+- Available Time: {available_time} minutes per day
+- Preferred Exercises: {preferred_exercises}
+
+Please provide:
+1. A detailed workout plan with specific exercises, sets, reps, and weekly schedule
+2. BMI analysis and health recommendations
+3. How the workout plan aligns with nutrition goals
+4. Progression tips and tracking suggestions
+5. Safety considerations and precautions
+
+Consider the user's fitness level, available time, and preferences.
+Make the plan practical and achievable.
+"""
+
+@lru_cache(maxsize=128)
+def plan_request(workout_goal: str, fitness_level: str, available_time: int, preferred_exercises: str) -> str:
+    """Fitness parameters and instructions section of the prompt, formatted once per combination"""
+    return _PLAN_REQUEST_TEMPLATE.format(
+        workout_goal=workout_goal,
+        fitness_level=fitness_level,
+        available_time=available_time,
+        preferred_exercises=preferred_exercises
+    )
+
 def calculate_bmi(weight: float, height: float) -> float:
     """Calculate BMI from weight (kg) and height (cm)"""
     height_m = height / 100  # Convert cm to meters
@@ -130,99 +193,84 @@ def workout_planning(
     try:
         # Get current session ID
         session_id = cl.user_session.get("conversation_id", "default_session")
+        data_manager = get_data_manager()
+        
+        # Start the memory lookup (a network call) first so it overlaps the local reads below
+        memory_available = memory_manager.is_available()
+        pending_context = None
+        if memory_available:
+            pending_context = memory_manager.submit(
+                memory_manager.get_personalized_context, session_id, "workout fitness"
+            )
         
         # Get user's existing goals and data
         existing_goals = data_manager.get_goals(session_id)
         food_logs = data_manager.get_food_logs(session_id, limit=10)
         
         # Get personalized context from memory
-        personalized_context = ""
-        if memory_manager.is_available():
-            personalized_context = memory_manager.get_personalized_context(session_id, "workout fitness")
+        personalized_context = pending_context.result() if pending_context else ""
         
-        # Calculate BMI and related metrics if data is available
+        # Calculate BMI and related metrics once if data is available; reused in the response
+        bmi = calculate_bmi(weight, height) if weight and height else None
+        bmi_category = get_bmi_category(bmi) if bmi is not None else None
         bmi_info = ""
         calorie_info = ""
         
-        if weight and height:
-            bmi = calculate_bmi(weight, height)
-            bmi_category = get_bmi_category(bmi)
+        if bmi is not None:
             bmi_info = f"BMI: {bmi:.1f} ({bmi_category})"
             
             if age:
                 calories_needed = calculate_calorie_needs(weight, height, age)
                 calorie_info = f"Estimated daily calorie needs: {calories_needed} calories"
         
-        # Prepare comprehensive context for workout planning
-        context = f"""
-        Create a personalized workout plan for the user.
-        
-        User Query: {user_query}
-        
-        Physical Stats:
-        - Weight: {weight if weight else 'Not provided'} kg
-        - Height: {height if height else 'Not provided'} cm
-        - Age: {age if age else 'Not provided'} years
-        - {bmi_info if bmi_info else 'BMI not calculated'}
-        - {calorie_info if calorie_info else 'Calorie needs not calculated'}
+        # Recent foods are only serialized when there are any
+        if food_logs:
+            recent_foods = dumps([{
+                'food': log.get('food', 'Unknown'),
+                'meal_type': log.get('meal_type', 'Unknown'),
+                'calories': log.get('calories', 0)
+            } for log in food_logs[:5]], indent=False)
+        else:
+            recent_foods = 'No recent food logs'
         
-        Fitness Parameters:
-        - Fitness Level: {fitness_level}
-        - Primary Goal: {workout_goal}
-        - Available Time: {available_time} minutes per day
-        - Preferred Exercises: {preferred_exercises}
-        
-        Current Nutrition Goals:
-        - Calories: {existing_goals.get('calories', 'Not set')}
-        - Protein: {existing_goals.get('protein', 'Not set')}g
-        - Carbs: {existing_goals.get('carbs', 'Not set')}g
-        - Fat: {existing_goals.get('fat', 'Not set')}g
-        
-        Recent Food Intake:
-        {json.dumps([{
-            'food': log.get('food_item', 'Unknown'),
-            'meal_type': log.get('meal_type', 'Unknown'),
-            'calories': log.get('calories_estimated', 0)
-        } for log in food_logs[:5]], indent=2) if food_logs else 'No recent food logs'}
-        
-        {personalized_context if personalized_context else 'No personalized context available'}
-        
-        Please provide:
-        1. A detailed workout plan with specific exercises, sets, reps, and weekly schedule
-        2. BMI analysis and health recommendations
-        3. How the workout plan aligns with nutrition goals
-        4. Progression tips and tracking suggestions
-        5. Safety considerations and precautions
-        
-        Consider the user's fitness level, available time, and preferences.
-        Make the plan practical and achievable.
-        """
+        # Prepare comprehensive context for workout planning
+        context = _CONTEXT_TEMPLATE.format(
+            user_query=user_query,
+            weight=weight if weight else 'Not provided',
+            height=height if height else 'Not provided',
+            age=age if age else 'Not provided',
+            bmi_info=bmi_info if bmi_info else 'BMI not calculated',
+            calorie_info=calorie_info if calorie_info else 'Calorie needs not calculated',
+            calories=existing_goals.get('calories', 'Not set'),
+            protein=existing_goals.get('protein', 'Not set'),
+            carbs=existing_goals.get('carbs', 'Not set'),
+            fat=existing_goals.get('fat', 'Not set'),
+            recent_foods=recent_foods,
+            personalized_context=personalized_context if personalized_context else 'No personalized context available'
+        ) + plan_request(workout_goal, fitness_level, available_time, preferred_exercises)
         
         # Generate workout plan using AI
-        chat_response = client.chat.parse(
+        chat_response = client.chat.complete(
             model=mistral_model,
             messages=[
                 {
                     "role": "system",
-                    "content": """You are an expert fitness trainer and nutritionist. 
-                    Create comprehensive, personalized workout plans that are safe, effective, and aligned with the user's goals.
-                    Consider their BMI, dietary goals, and personal preferences.
-                    Provide practical, actionable advice."""
+                    "content": _SYSTEM_PROMPT
                 },
                 {
                     "role": "user",
                     "content": context
                 }
             ],
-            response_format=WorkoutPlanningAgent,
+            response_format=_WORKOUT_RESPONSE_FORMAT,
             max_tokens=800,
             temperature=0.3
         )
         
-        workout_plan_data = json.loads(chat_response.choices[0].message.content)
+        workout_plan_data = loads(chat_response.choices[0].message.content)
         
         # Store workout preferences in memory for future personalization
-        if memory_manager.is_available():
+        if memory_available:
             workout_summary = f"Workout plan created for {workout_goal} with {fitness_level} fitness level, {available_time} min/day, prefers {preferred_exercises}"
             memory_manager.add_workout_preference(session_id, workout_summary, user_query)
         
@@ -242,22 +290,22 @@ def workout_planning(
                 "weight": weight,
                 "height": height,
                 "age": age,
-                "bmi": round(calculate_bmi(weight, height), 1) if weight and height else None,
-                "bmi_category": get_bmi_category(calculate_bmi(weight, height)) if weight and height else None,
+                "bmi": round(bmi, 1) if bmi is not None else None,
+                "bmi_category": bmi_category,
                 "fitness_level": fitness_level,
                 "workout_goal": workout_goal,
                 "available_time": available_time
             },
-            "generated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            "generated_at": iso_now(sep=" ")
         }
         
         logger.info(f"Workout plan generated for session {session_id}: {workout_goal}")
-        return json.dumps(result, indent=2)
+        return dumps(result, indent=False)
         
     except Exception as e:
         logger.error(f"Error in workout_planning: {e}")
-        return json.dumps({
+        return dumps({
             "status": "error",
             "message": "An error occurred while creating your workout plan. Please try again.",
             "error": str(e)
-        }, indent=2) 
\ No newline at end of file
+        }, indent=False) 
\ No newline at end of file